@@ -0,0 +1,117 @@
+import asyncio
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+
+class AdmissionError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+class AdmissionController:
+    # Cells are reserved per client from submission until the scan finishes,
+    # and a job only starts running once the global in-flight budget has room
+    def __init__(self, max_cells_per_job=5000, max_client_cells=10000, max_running_cells=20000,
+                 max_queued_cells=50000):
+        self.max_running_cells = max_running_cells
+        self.max_cells_per_job = min(max_cells_per_job, max_running_cells)
+        self.max_client_cells = max_client_cells
+        self.max_queued_cells = max_queued_cells
+        self.condition = threading.Condition()
+        self.client_cells = defaultdict(int)
+        self.reserved_cells = 0
+        self.running_cells = 0
+        self.queued_jobs = 0
+        self.waiters = []
+        self.counters = {"admitted": 0, "rejected": 0}
+
+    def admit(self, client, cells, estimated_bytes):
+        with self.condition:
+            if cells > self.max_cells_per_job:
+                error = AdmissionError(
+                    f"Area too large: {cells} cells (~{estimated_bytes / 1024 ** 2:.0f} MB) exceeds the "
+                    f"{self.max_cells_per_job} cell limit per scan, please zoom in", 413)
+            elif self.client_cells[client] + cells > self.max_client_cells:
+                error = AdmissionError(
+                    f"Too many scans in progress: {self.client_cells[client]} cells already pending for this "
+                    f"client, limit is {self.max_client_cells}", 429)
+            elif self.reserved_cells - self.running_cells + cells > self.max_queued_cells:
+                error = AdmissionError("Server is busy, please try again shortly", 503)
+            else:
+                error = None
+
+            if error is not None:
+                self.counters["rejected"] += 1
+                raise error
+
+            self.client_cells[client] += cells
+            self.reserved_cells += cells
+            self.queued_jobs += 1
+            self.counters["admitted"] += 1
+
+    def try_start(self, cells, waiter=None):
+        # Starts the job if the running budget has room, otherwise waiter is
+        # called once some job releases its cells
+        with self.condition:
+            if self.running_cells + cells > self.max_running_cells:
+                if waiter is not None:
+                    self.waiters.append(waiter)
+                return False
+            self.running_cells += cells
+            self.queued_jobs -= 1
+            return True
+
+    def release(self, client, cells, started):
+        with self.condition:
+            if started:
+                self.running_cells -= cells
+            else:
+                self.queued_jobs -= 1
+            self.reserved_cells -= cells
+            self.client_cells[client] -= cells
+            if not self.client_cells[client]:
+                del self.client_cells[client]
+            self.condition.notify_all()
+            waiters, self.waiters = self.waiters, []
+        for waiter in waiters:
+            waiter()
+
+    @contextmanager
+    def running(self, client, cells):
+        started = False
+        try:
+            with self.condition:
+                self.condition.wait_for(lambda: self.running_cells + cells <= self.max_running_cells)
+                self.running_cells += cells
+                self.queued_jobs -= 1
+            started = True
+            yield
+        finally:
+            self.release(client, cells, started)
+
+    @asynccontextmanager
+    async def running_async(self, client, cells):
+        # Same as running, but waits on the caller's event loop instead of
+        # holding a thread
+        loop = asyncio.get_running_loop()
+        started = False
+        try:
+            while not started:
+                event = asyncio.Event()
+                started = self.try_start(cells, lambda: loop.call_soon_threadsafe(event.set))
+                if not started:
+                    await event.wait()
+            yield
+        finally:
+            self.release(client, cells, started)
+
+    def stats(self):
+        with self.condition:
+            return {
+                **self.counters,
+                "queued_jobs": self.queued_jobs,
+                "queued_cells": self.reserved_cells - self.running_cells,
+                "running_cells": self.running_cells,
+                "max_running_cells": self.max_running_cells,
+                "clients": len(self.client_cells),
+            }
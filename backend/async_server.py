@@ -0,0 +1,186 @@
+import argparse
+import asyncio
+import os
+import threading
+import socketio
+from aiohttp import web
+
+from main import (
+    scan_loop, scan_jobs, admission, model_manager, known_courts, set_async_socketio, emit_to,
+    register_socket, unregister_socket, get_scan_room, SOCKET_NAMESPACES,
+    get_bounding_box, get_client_id, admit_scan, run_admitted_scan_async, find_scan_results, get_stats,
+    MODEL_ADMIN_TOKEN,
+)
+from admission import AdmissionError
+
+# Serves the same API as main.py, but every route and the Socket.IO server run
+# on scan_loop next to the scans themselves, so a waiting request costs a
+# coroutine rather than a thread. Decoding and inference stay on executors.
+sio = socketio.AsyncServer(async_mode='aiohttp', cors_allowed_origins='*')
+set_async_socketio(sio)
+
+def register_namespace(namespace):
+    async def connect(sid, environ, auth=None):
+        register_socket(sid, namespace, get_request_client(environ['aiohttp.request']))
+
+    async def disconnect(sid, reason=None):
+        unregister_socket(sid)
+
+    sio.on('connect', connect, namespace=namespace)
+    sio.on('disconnect', disconnect, namespace=namespace)
+
+for namespace in SOCKET_NAMESPACES:
+    register_namespace(namespace)
+
+@web.middleware
+async def cors(request, handler):
+    # Socket.IO answers its own CORS requests
+    if request.path.startswith('/socket.io'):
+        return await handler(request)
+    response = web.Response() if request.method == 'OPTIONS' else await handler(request)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Headers'] = request.headers.get('Access-Control-Request-Headers', '*')
+    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+    return response
+
+def get_request_client(request):
+    return get_client_id(request.headers, request.remote)
+
+def bad_bounding_box():
+    return web.json_response({"error": "Please provide top-left and bottom-right coordinates"}, status=400)
+
+async def index(request):
+    return web.Response(text="API is running")
+
+async def get_known_courts(request):
+    bounding_box = get_bounding_box(request.query)
+    if bounding_box is None:
+        return bad_bounding_box()
+    tennis_courts = await asyncio.to_thread(known_courts.query, *bounding_box) if known_courts else []
+    return web.json_response({"tennis_courts": tennis_courts})
+
+async def get_scan_results(request):
+    bounding_box = get_bounding_box(request.query)
+    if bounding_box is None:
+        return bad_bounding_box()
+
+    loaded = model_manager.loaded
+    if loaded is None:
+        return web.json_response({"error": "Model is not ready"}, status=503)
+    return web.json_response(await asyncio.to_thread(find_scan_results, bounding_box, loaded))
+
+async def stats(request):
+    return web.json_response(await asyncio.to_thread(get_stats))
+
+async def ready(request):
+    status = model_manager.status()
+    return web.json_response(status, status=200 if status["ready"] else 503)
+
+async def reload_model(request):
+    if not MODEL_ADMIN_TOKEN or request.headers.get('Authorization') != f"Bearer {MODEL_ADMIN_TOKEN}":
+        return web.json_response({"error": "Not allowed"}, status=403)
+
+    try:
+        version = (await request.json() or {}).get('version')
+    except ValueError:
+        version = None
+    model_manager.load_in_background(version)
+    return web.json_response({"reloading": version or "latest"}, status=202)
+
+async def find_courts(request):
+    bounding_box = get_bounding_box(request.query)
+    if bounding_box is None:
+        return bad_bounding_box()
+
+    client = get_request_client(request)
+    sid = get_scan_room(request.query.get('sid'), client)
+
+    try:
+        job_id, estimate = admit_scan(bounding_box, sid, client, run_admitted_scan_async)
+    except AdmissionError as e:
+        emit_to(sid, 'error', {'message': str(e)})
+        return web.json_response({"error": str(e)}, status=e.status)
+
+    try:
+        emit_to(sid, 'status', {'message': f"Scanning {estimate['cells']} cells"})
+        tennis_courts = await scan_jobs.wait_async(job_id)
+
+        emit_to(sid, 'complete', {'courtCount': len(tennis_courts)})
+        return web.json_response({"tennis_courts": tennis_courts})
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        emit_to(sid, 'error', {'message': 'Something went wrong during court detection.'})
+        return web.json_response({"error": "An error occurred during processing"}, status=500)
+
+async def submit_scan(request):
+    args = None
+    if request.can_read_body:
+        try:
+            args = await request.json()
+        except ValueError:
+            pass
+    args = args or request.query
+    bounding_box = get_bounding_box(args)
+    if bounding_box is None:
+        return bad_bounding_box()
+
+    client = get_request_client(request)
+    sid = get_scan_room(args.get('sid'), client)
+
+    try:
+        job_id, estimate = admit_scan(bounding_box, sid, client, run_admitted_scan_async)
+    except AdmissionError as e:
+        return web.json_response({"error": str(e)}, status=e.status)
+    return web.json_response({"job_id": job_id, **estimate, "queue": admission.stats()}, status=202)
+
+async def get_scan(request):
+    job = scan_jobs.get(request.match_info['job_id'])
+    if job is None:
+        return web.json_response({"error": "Unknown job"}, status=404)
+    return web.json_response(scan_jobs.describe(job))
+
+async def get_scan_result(request):
+    job = scan_jobs.get(request.match_info['job_id'])
+    if job is None:
+        return web.json_response({"error": "Unknown job"}, status=404)
+    if job["status"] == "failed":
+        return web.json_response({"error": "An error occurred during processing"}, status=500)
+    if job["status"] != "done":
+        return web.json_response(scan_jobs.describe(job), status=202)
+    return web.json_response({"tennis_courts": job["result"]})
+
+def create_app():
+    app = web.Application(middlewares=[cors])
+    sio.attach(app)
+    app.router.add_get('/', index)
+    app.router.add_get('/known-courts', get_known_courts)
+    app.router.add_get('/scan-results', get_scan_results)
+    app.router.add_get('/stats', stats)
+    app.router.add_get('/ready', ready)
+    app.router.add_post('/model/reload', reload_model)
+    app.router.add_get('/find-courts', find_courts)
+    app.router.add_post('/scans', submit_scan)
+    app.router.add_get('/scans/{job_id}', get_scan)
+    app.router.add_get('/scans/{job_id}/result', get_scan_result)
+    return app
+
+async def serve(host, port):
+    runner = web.AppRunner(create_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Serving on {host}:{port}")
+    return runner
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the API and Socket.IO from the scan event loop")
+    parser.add_argument('--host', default=os.getenv('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', 5000)))
+    args = parser.parse_args()
+
+    # scan_loop already runs on its own thread; the main thread only waits
+    runner = asyncio.run_coroutine_threadsafe(serve(args.host, args.port), scan_loop).result()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), scan_loop).result(timeout=10)
@@ -0,0 +1,128 @@
+import glob
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import numpy as np
+from PIL import Image
+from geopy.distance import geodesic
+
+from inference import load_backend
+from main import model_manager, preprocess_batch, preprocess_regions, predict_in_batches, merge_courts, decode_image, get_model_box
+from quadtree import get_quadrant_boxes
+from main import INFERENCE_BACKEND, INFERENCE_MODEL_PATH, BATCH_SIZE
+
+model = model_manager.current().backend
+
+# Random satellite-sized tiles; inference cost doesn't depend on content
+def make_tiles(count, size=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    return [Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8)) for _ in range(count)]
+
+# One model.predict call per tile, the way find_courts used to score a grid
+def score_per_tile(images):
+    scores = []
+    for img in images:
+        indices, img_array = preprocess_batch([img])
+        scores.append(model.predict(img_array)[0])
+    return scores
+
+# Whole grid preprocessed into one tensor and scored in sized batches
+def score_batched(images):
+    indices, batch = preprocess_batch(images)
+    return predict_in_batches(batch, model)
+
+def tiles_per_second(fn, images):
+    fn(images[:2])  # warm up graph tracing
+    start = time.perf_counter()
+    fn(images)
+    return len(images) / (time.perf_counter() - start)
+
+# Detections scattered over a ~10 km box, clumped the way quadrant hits are
+def make_detections(count, seed=0):
+    rng = np.random.default_rng(seed)
+    sites = rng.uniform((37.70, -122.50), (37.79, -122.39), (count // 4, 2))
+    jitter = rng.normal(0, 0.0003, (len(sites) * 4, 2))
+    return [tuple(point) for point in np.repeat(sites, 4, axis=0) + jitter]
+
+# The pairwise geodesic merge find_courts used to run on every detection
+def merge_pairwise(detections, proximity=200):
+    tennis_courts = []
+    for lat, lon in detections:
+        for court in tennis_courts:
+            if geodesic((court["latitude"], court["longitude"]), (lat, lon)).meters < proximity:
+                court["latitude"] = (court["latitude"] + lat) / 2
+                court["longitude"] = (court["longitude"] + lon) / 2
+                break
+        else:
+            tennis_courts.append({"latitude": lat, "longitude": lon})
+    return tennis_courts
+
+def time_merge(fn, detections):
+    start = time.perf_counter()
+    courts = fn(detections)
+    return time.perf_counter() - start, len(courts)
+
+# Re-encode the satellite screenshots in iterations/images the way Static Maps
+# serves them: the old 640px zoom-19 PNG (what size=1000x1000 actually got
+# back) against a 320px zoom-18 JPEG covering the same ground
+def make_encoded_tiles(size, image_format):
+    tiles = []
+    for path in sorted(glob.glob('../iterations/images/*.png')):
+        img = Image.open(path).convert('RGB').resize((size, size))
+        buffer = BytesIO()
+        img.save(buffer, image_format, **({'quality': 85} if image_format == 'JPEG' else {}))
+        tiles.append(buffer.getvalue())
+    return tiles
+
+def time_decode(tiles, repeat=10):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        images = [decode_image(img_data) for img_data in tiles]
+        preprocess_batch(images)
+        preprocess_regions([(img, box) for img in images for box in get_quadrant_boxes(get_model_box((0, 0, *img.size)))])
+    return (time.perf_counter() - start) / (repeat * len(tiles))
+
+# Batches submitted from as many threads as there are workers, the way
+# concurrent scans hit a WorkerPoolBackend
+def pool_tiles_per_second(workers, batches=24):
+    batch = np.random.default_rng(0).integers(0, 256, (BATCH_SIZE, 150, 150, 3), dtype=np.uint8)
+    pool = load_backend(INFERENCE_BACKEND, INFERENCE_MODEL_PATH, workers=workers)
+    try:
+        with ThreadPoolExecutor(workers) as executor:
+            list(executor.map(pool.predict, [batch] * workers))
+            start = time.perf_counter()
+            list(executor.map(pool.predict, [batch] * batches))
+            return batches * BATCH_SIZE / (time.perf_counter() - start)
+    finally:
+        pool.close()
+
+if __name__ == "__main__":
+    images = make_tiles(128)
+
+    per_tile = tiles_per_second(score_per_tile, images)
+    batched = tiles_per_second(score_batched, images)
+
+    print(f"per-tile predict: {per_tile:.1f} tiles/sec")
+    print(f"batched predict:  {batched:.1f} tiles/sec ({batched / per_tile:.1f}x)")
+
+    # BENCHMARK_WORKERS=1,2,8 checks a bigger pool than this machine's core count
+    worker_counts = [int(n) for n in os.getenv('BENCHMARK_WORKERS', '').split(',') if n]
+    worker_counts = worker_counts or sorted({1, 2, os.cpu_count() // 2 or 1, os.cpu_count() or 1})
+    single = None
+    for workers in worker_counts:
+        speed = pool_tiles_per_second(workers)
+        single = single or speed
+        print(f"{workers} inference workers: {speed:.1f} tiles/sec ({speed / single:.1f}x, ideal {workers}x)")
+
+    for label, size, image_format in (("640px png", 640, 'PNG'), ("320px jpg", 320, 'JPEG')):
+        tiles = make_encoded_tiles(size, image_format)
+        average_bytes = sum(len(img_data) for img_data in tiles) / len(tiles)
+        print(f"{label}: {average_bytes / 1024:.0f} KB/tile, decode+preprocess {time_decode(tiles) * 1000:.1f} ms/tile")
+
+    detections = make_detections(2000)
+    pairwise_time, pairwise_count = time_merge(merge_pairwise, detections)
+    indexed_time, indexed_count = time_merge(merge_courts, detections)
+
+    print(f"pairwise merge: {pairwise_time * 1000:.0f} ms, {pairwise_count} courts")
+    print(f"indexed merge:  {indexed_time * 1000:.0f} ms, {indexed_count} courts ({pairwise_time / indexed_time:.0f}x)")
@@ -0,0 +1,92 @@
+import threading
+import numpy as np
+
+# Google's "no imagery here" tile, the one get_non_courts.py throws away
+PLACEHOLDER_COLOR = (0xe3, 0xe2, 0xde)
+GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+def get_gray(batch):
+    return batch.astype(np.float32) @ GRAY_WEIGHTS
+
+# 3x3 Sobel over the valid region, so each pass trims one pixel off every side
+def sobel_x(gray):
+    smoothed = gray[:, :-2] + 2 * gray[:, 1:-1] + gray[:, 2:]
+    return smoothed[:, :, 2:] - smoothed[:, :, :-2]
+
+def sobel_y(gray):
+    smoothed = gray[:, :, :-2] + 2 * gray[:, :, 1:-1] + gray[:, :, 2:]
+    return smoothed[:, 2:] - smoothed[:, :-2]
+
+def is_placeholder(batch, threshold=0.95):
+    # Same test as is_majority_color in data/get_non_courts.py
+    color_diff = np.abs(batch.astype(np.int16) - np.array(PLACEHOLDER_COLOR, dtype=np.int16)).sum(axis=-1)
+    return (color_diff < 50).mean(axis=(1, 2)) > threshold
+
+def is_flat(batch, min_std=6.0):
+    # Open water, snow and blank fill have next to no contrast
+    return get_gray(batch).std(axis=(1, 2)) < min_std
+
+def get_bright_line_fraction(batch):
+    # find_bright_lines from data/filter_image.py: a strong first derivative
+    # with a strongly negative second derivative along the same axis
+    gray = get_gray(batch)
+    first_x, first_y = sobel_x(gray), sobel_y(gray)
+    lines_x = (first_x[:, 1:-1, 1:-1] > 50) & (sobel_x(first_x) < -50)
+    lines_y = (first_y[:, 1:-1, 1:-1] > 50) & (sobel_y(first_y) < -50)
+    return (lines_x | lines_y).mean(axis=(1, 2))
+
+def has_no_bright_lines(batch, min_fraction=0.002):
+    return get_bright_line_fraction(batch) < min_fraction
+
+STAGES = {
+    'placeholder': is_placeholder,
+    'flat': is_flat,
+    'lines': has_no_bright_lines,
+}
+
+class Cascade:
+    # Cheap vectorized checks run on the preprocessed uint8 batch, in order;
+    # a tile rejected by any stage never reaches the CNN
+    def __init__(self, stages, flat_std=6.0, min_line_fraction=0.002):
+        unknown = [name for name in stages if name not in STAGES]
+        if unknown:
+            raise ValueError(f"Unknown cascade stage(s) {', '.join(unknown)}, expected some of {', '.join(STAGES)}")
+        self.stages = list(stages)
+        self.options = {'flat': {'min_std': flat_std}, 'lines': {'min_fraction': min_line_fraction}}
+        self.lock = threading.Lock()
+        self.counters = {name: {"seen": 0, "rejected": 0} for name in self.stages}
+
+    @property
+    def signature(self):
+        # Scores cached under one cascade setup aren't valid for another
+        return ','.join(
+            f"{name}({','.join(f'{k}={v}' for k, v in self.options.get(name, {}).items())})" for name in self.stages
+        )
+
+    def reject(self, batch):
+        # Returns, for each stage, a mask of the tiles it rejected
+        candidates = np.arange(len(batch))
+        rejected = {}
+        for name in self.stages:
+            mask = np.zeros(len(batch), dtype=bool)
+            if len(candidates):
+                mask[candidates] = STAGES[name](batch[candidates], **self.options.get(name, {}))
+            with self.lock:
+                self.counters[name]["seen"] += len(candidates)
+                self.counters[name]["rejected"] += int(mask.sum())
+            rejected[name] = mask
+            candidates = candidates[~mask[candidates]]
+        return rejected
+
+    def filter(self, batch):
+        keep = np.ones(len(batch), dtype=bool)
+        for mask in self.reject(batch).values():
+            keep &= ~mask
+        return keep
+
+    def stats(self):
+        with self.lock:
+            return {
+                name: {**counts, "rejection_rate": counts["rejected"] / counts["seen"] if counts["seen"] else 0.0}
+                for name, counts in self.counters.items()
+            }
@@ -0,0 +1,71 @@
+import argparse
+import glob
+import os
+import time
+import numpy as np
+from tensorflow.keras.preprocessing import image
+
+from inference import load_backend
+
+# Same class ordering as flow_from_directory in train.py
+def load_dataset(directory):
+    classes = sorted(os.listdir(directory))
+    paths, labels = [], []
+    for label, name in enumerate(classes):
+        for path in sorted(glob.glob(os.path.join(directory, name, '*'))):
+            paths.append(path)
+            labels.append(label)
+
+    if not paths:
+        raise FileNotFoundError(f"No images found under {directory}")
+    batch = np.stack([image.img_to_array(image.load_img(path, target_size=(150, 150)), dtype=np.uint8) for path in paths])
+    return batch, np.array(labels), classes
+
+def score(backend, batch, batch_size=32):
+    backend.predict(batch[:batch_size])  # warm up
+    start = time.perf_counter()
+    scores = np.concatenate([backend.predict(batch[i:i + batch_size]) for i in range(0, len(batch), batch_size)])
+    return scores, len(batch) / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report accuracy deltas of exported inference backends against the Keras model")
+    parser.add_argument('--keras-model', default=os.getenv('LOCAL_MODEL_PATH', '/tmp/tennis_court_classifier.keras'))
+    parser.add_argument('--candidate', action='append', default=[], metavar='BACKEND=PATH',
+                        help="e.g. tflite=/tmp/court_int8.tflite; may be repeated")
+    parser.add_argument('--dataset', default='../dataset/test')
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--output', default='inference_backends_report.md')
+    args = parser.parse_args()
+
+    batch, labels, classes = load_dataset(args.dataset)
+    reference_scores, reference_speed = score(load_backend('keras', args.keras_model), batch)
+    reference_predictions = reference_scores >= args.threshold
+    reference_accuracy = np.mean(reference_predictions == labels)
+
+    lines = [
+        "# Inference backend accuracy report",
+        "",
+        f"Dataset: `{args.dataset}` ({len(labels)} images, classes {', '.join(classes)}), threshold {args.threshold}",
+        "",
+        "| backend | model | size (MB) | accuracy | accuracy delta | agreement with keras | mean abs score delta | max abs score delta | tiles/sec |",
+        "|---|---|---|---|---|---|---|---|---|",
+        f"| keras | `{os.path.basename(args.keras_model)}` | {os.path.getsize(args.keras_model) / 1024 ** 2:.1f} "
+        f"| {reference_accuracy:.4f} | - | - | - | - | {reference_speed:.1f} |",
+    ]
+
+    for candidate in args.candidate:
+        name, path = candidate.split('=', 1)
+        scores, speed = score(load_backend(name, path), batch)
+        predictions = scores >= args.threshold
+        accuracy = np.mean(predictions == labels)
+        deltas = np.abs(scores - reference_scores)
+        lines.append(
+            f"| {name} | `{os.path.basename(path)}` | {os.path.getsize(path) / 1024 ** 2:.1f} "
+            f"| {accuracy:.4f} | {accuracy - reference_accuracy:+.4f} | {np.mean(predictions == reference_predictions):.4f} "
+            f"| {deltas.mean():.4f} | {deltas.max():.4f} | {speed:.1f} |"
+        )
+
+    report = "\n".join(lines) + "\n"
+    with open(args.output, 'w') as f:
+        f.write(report)
+    print(report)
@@ -0,0 +1,73 @@
+import argparse
+import math
+import time
+import numpy as np
+from PIL import Image
+
+from cascade import Cascade, STAGES
+from compare_backends import load_dataset
+
+# One-sided 95% Wilson upper bound on a rate observed as k out of n
+def get_upper_bound(k, n, z=1.645):
+    if not n:
+        return 1.0
+    p = k / n
+    center = p + z ** 2 / (2 * n)
+    margin = z * math.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2))
+    return min(1.0, (center + margin) / (1 + z ** 2 / n))
+
+# What pyramid scans screen: a cell spans only a few pixels of a coarse tile,
+# and its crop is scaled back up to the model input
+def get_coarse_crops(batch, pixels):
+    size = batch.shape[2], batch.shape[1]
+    return np.stack([
+        np.asarray(Image.fromarray(img).resize((pixels, pixels), Image.BILINEAR).resize(size, Image.BILINEAR))
+        for img in batch
+    ])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report per-stage rejection rates and recall loss of the pre-classifier cascade")
+    parser.add_argument('--dataset', default='../dataset/validation')
+    parser.add_argument('--stages', default=','.join(STAGES))
+    parser.add_argument('--flat-std', type=float, default=6.0)
+    parser.add_argument('--min-line-fraction', type=float, default=0.002)
+    parser.add_argument('--coarse-pixels', type=int, help="Evaluate on coarse crops as pyramid scans see them, "
+                        "a cell this many pixels wide (about 75 at zoom 16 and 640px around 39N)")
+    parser.add_argument('--positive-class', type=int, default=1, help="Label of the tennis court class")
+    parser.add_argument('--output', default='cascade_report.md')
+    args = parser.parse_args()
+
+    batch, labels, classes = load_dataset(args.dataset)
+    if args.coarse_pixels:
+        batch = get_coarse_crops(batch, args.coarse_pixels)
+    cascade = Cascade(args.stages.split(','), args.flat_std, args.min_line_fraction)
+
+    start = time.perf_counter()
+    rejected = cascade.reject(batch)
+    elapsed = time.perf_counter() - start
+
+    positives = labels == args.positive_class
+    lines = [
+        "# Pre-classifier cascade report" + (f" on {args.coarse_pixels}px coarse crops" if args.coarse_pixels else ""),
+        "",
+        f"Dataset: `{args.dataset}` ({positives.sum()} courts, {(~positives).sum()} non-courts, classes {', '.join(classes)}), "
+        f"cascade `{cascade.signature}`, {len(batch) / elapsed:.0f} tiles/sec",
+        "",
+        "| stage | non-courts rejected | courts rejected | recall loss | recall loss (95% upper bound) |",
+        "|---|---|---|---|---|",
+    ]
+
+    total = np.zeros(len(batch), dtype=bool)
+    for name, mask in list(rejected.items()) + [("all stages", None)]:
+        mask = total if mask is None else mask
+        total |= mask
+        lost = int(mask[positives].sum())
+        lines.append(
+            f"| {name} | {mask[~positives].mean():.2%} | {lost} of {positives.sum()} "
+            f"| {lost / max(positives.sum(), 1):.2%} | {get_upper_bound(lost, positives.sum()):.2%} |"
+        )
+
+    report = "\n".join(lines) + "\n"
+    with open(args.output, 'w') as f:
+        f.write(report)
+    print(report)
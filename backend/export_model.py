@@ -0,0 +1,83 @@
+import argparse
+import glob
+import os
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.models import load_model
+from tensorflow.keras.preprocessing import image
+
+from inference import add_rescaling
+
+# Validation images as raw uint8 pixels, the way the backend feeds the model
+def load_calibration_images(directory, limit=300, seed=0):
+    paths = sorted(glob.glob(os.path.join(directory, '*', '*')))
+    if not paths:
+        raise FileNotFoundError(f"No calibration images found under {directory}")
+    np.random.default_rng(seed).shuffle(paths)
+
+    for path in paths[:limit]:
+        img = image.load_img(path, target_size=(150, 150))
+        yield np.expand_dims(image.img_to_array(img, dtype=np.uint8), axis=0)
+
+def export_tflite(model, output_path, quantization, calibration_dir):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if quantization == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        # Post-training full-integer quantization; the uint8 input and float32
+        # output stay as they are so the backend feeds the same batches as Keras
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([batch] for batch in load_calibration_images(calibration_dir))
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+
+def export_onnx(model, output_path, quantization, calibration_dir):
+    try:
+        import tf2onnx
+    except ImportError:
+        raise ImportError("ONNX export needs the tf2onnx package")
+
+    spec = (tf.TensorSpec((None, 150, 150, 3), tf.uint8, name='input'),)
+    float_path = output_path if quantization == 'none' else f"{output_path}.float32"
+    tf2onnx.convert.from_keras(model, input_signature=spec, output_path=float_path)
+
+    if quantization == 'float16':
+        import onnx
+        from onnxconverter_common import float16
+        onnx.save(float16.convert_float_to_float16(onnx.load(float_path), keep_io_types=True), output_path)
+    elif quantization == 'int8':
+        from onnxruntime.quantization import CalibrationDataReader, QuantType, quantize_static
+
+        class ValidationReader(CalibrationDataReader):
+            def __init__(self):
+                self.batches = ({'input': batch} for batch in load_calibration_images(calibration_dir))
+
+            def get_next(self):
+                return next(self.batches, None)
+
+        quantize_static(float_path, output_path, ValidationReader(), weight_type=QuantType.QInt8)
+
+    if float_path != output_path:
+        os.remove(float_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the Keras court classifier for a faster CPU inference backend")
+    parser.add_argument('--model', default=os.getenv('LOCAL_MODEL_PATH', '/tmp/tennis_court_classifier.keras'))
+    parser.add_argument('--format', choices=['tflite', 'onnx'], required=True)
+    parser.add_argument('--quantization', choices=['none', 'float16', 'int8'], default='none')
+    parser.add_argument('--calibration-dir', default='../dataset/validation')
+    parser.add_argument('--output', required=True)
+    args = parser.parse_args()
+
+    model = add_rescaling(load_model(args.model))
+    if args.format == 'tflite':
+        export_tflite(model, args.output, args.quantization, args.calibration_dir)
+    else:
+        export_onnx(model, args.output, args.quantization, args.calibration_dir)
+
+    print(f"Exported {args.format} ({args.quantization}) model to {args.output} "
+          f"({os.path.getsize(args.output) / 1024 ** 2:.1f} MB)")
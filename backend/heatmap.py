@@ -0,0 +1,66 @@
+import numpy as np
+
+# VGG16 downsamples by 32, so the converted head moves over the mosaic in
+# 32px steps and every output is the classifier's score for the 150px window
+# starting there
+HEATMAP_STRIDE = 32
+WINDOW_SIZE = 150
+
+def build_heatmap_model(model_path):
+    # Rebuilds the classifier from train.py as a fully convolutional model:
+    # the VGG16 backbone takes any input size, the first Dense layer becomes a
+    # conv over the whole backbone grid and the later ones become 1x1 convs
+    import tensorflow as tf
+    model = tf.keras.models.load_model(model_path)
+    base = next(layer for layer in model.layers if isinstance(layer, tf.keras.Model))
+    dense_layers = [layer for layer in model.layers if isinstance(layer, tf.keras.layers.Dense)]
+
+    backbone = tf.keras.applications.VGG16(include_top=False, weights=None, input_shape=(None, None, 3))
+    backbone.set_weights(base.get_weights())
+    grid = tuple(base.output.shape[1:3])
+
+    inputs = tf.keras.Input(shape=(None, None, 3), dtype='uint8')
+    x = backbone(tf.keras.layers.Rescaling(1 / 255.0)(inputs))
+    for k, layer in enumerate(dense_layers):
+        kernel, bias = layer.get_weights()
+        kernel_size = grid if k == 0 else (1, 1)
+        conv = tf.keras.layers.Conv2D(kernel.shape[1], kernel_size, activation=layer.activation)
+        x = conv(x)
+        conv.set_weights([kernel.reshape(*kernel_size, -1, kernel.shape[1]), bias])
+    return tf.keras.Model(inputs, x)
+
+class HeatmapModel:
+    def __init__(self, model_path, block_size=512):
+        # Blocks overlap by one window, so every window position in the mosaic
+        # is scored exactly once while memory stays bounded
+        if block_size % HEATMAP_STRIDE:
+            raise ValueError(f"Heatmap block size must be a multiple of {HEATMAP_STRIDE}")
+        self.model_path = model_path
+        self.model = build_heatmap_model(model_path)
+        self.block_size = block_size
+
+    def predict_map(self, mosaic):
+        height, width = mosaic.shape[:2]
+        rows = max(0, (height - WINDOW_SIZE) // HEATMAP_STRIDE + 1)
+        cols = max(0, (width - WINDOW_SIZE) // HEATMAP_STRIDE + 1)
+        heatmap = np.zeros((rows, cols), dtype=np.float32)
+
+        margin = WINDOW_SIZE - HEATMAP_STRIDE
+        for top in range(0, rows * HEATMAP_STRIDE, self.block_size):
+            for left in range(0, cols * HEATMAP_STRIDE, self.block_size):
+                block = mosaic[top:top + self.block_size + margin, left:left + self.block_size + margin]
+                scores = np.asarray(self.model.predict_on_batch(block[None]))[0, :, :, 0]
+                row, col = top // HEATMAP_STRIDE, left // HEATMAP_STRIDE
+                scores = scores[:rows - row, :cols - col]
+                heatmap[row:row + scores.shape[0], col:col + scores.shape[1]] = scores
+        return heatmap
+
+def find_peaks(heatmap, threshold=0.5):
+    # Local maxima over each 3x3 neighbourhood, as (row, col, score)
+    padded = np.pad(heatmap, 1, constant_values=-np.inf)
+    height, width = heatmap.shape
+    neighbourhood = np.max(
+        [padded[dr:dr + height, dc:dc + width] for dr in range(3) for dc in range(3)], axis=0
+    )
+    rows, cols = np.nonzero((heatmap >= neighbourhood) & (heatmap >= threshold))
+    return [(int(r), int(c), float(heatmap[r, c])) for r, c in zip(rows, cols)]
@@ -0,0 +1,225 @@
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from multiprocessing.connection import Client
+import numpy as np
+
+# Every backend takes raw uint8 pixels; the 1/255 rescale train.py applied
+# in its data generators runs inside the model graph instead
+def add_rescaling(model):
+    import tensorflow as tf
+    inputs = tf.keras.Input(shape=model.input_shape[1:], dtype='uint8')
+    outputs = model(tf.keras.layers.Rescaling(1 / 255.0)(inputs))
+    return tf.keras.Model(inputs, outputs)
+
+class KerasBackend:
+    name = 'keras'
+
+    def __init__(self, model_path):
+        from tensorflow.keras.models import load_model
+        self.model_path = model_path
+        self.model = add_rescaling(load_model(model_path))
+
+    def predict(self, batch):
+        return np.asarray(self.model.predict_on_batch(batch)).reshape(-1)
+
+class TFLiteBackend:
+    name = 'tflite'
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        self.model_path = model_path
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size = None
+
+    def predict(self, batch):
+        if len(batch) != self.batch_size:
+            self.interpreter.resize_tensor_input(self.input['index'], batch.shape)
+            self.interpreter.allocate_tensors()
+            self.batch_size = len(batch)
+
+        # Fully int8 models take and return quantized tensors
+        scale, zero_point = self.input['quantization']
+        if self.input['dtype'] != np.float32 and scale:
+            batch = np.round(batch / scale + zero_point)
+        self.interpreter.set_tensor(self.input['index'], batch.astype(self.input['dtype']))
+        self.interpreter.invoke()
+
+        scores = self.interpreter.get_tensor(self.output['index']).astype(np.float32)
+        scale, zero_point = self.output['quantization']
+        if self.output['dtype'] != np.float32 and scale:
+            scores = (scores - zero_point) * scale
+        return scores.reshape(-1)
+
+class OnnxBackend:
+    name = 'onnx'
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("The onnx inference backend needs the onnxruntime package")
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.model_path = model_path
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        scores = self.session.run(None, {self.input_name: batch})[0]
+        return np.asarray(scores).reshape(-1)
+
+def stop_workers(processes, addresses):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait()
+    for address in addresses:
+        if os.path.exists(address):
+            os.remove(address)
+
+class WorkerPoolBackend:
+    name = 'pool'
+
+    # Each worker is an inference_server.py process holding its own copy of the
+    # model. predict() takes whichever worker is idle, so concurrent batches
+    # from any scan spread across all of them and across all cores.
+    def __init__(self, backend_name, model_path, workers, num_threads=None, startup_timeout=300,
+                 predict_timeout=120):
+        self.backend_name = backend_name
+        self.model_path = model_path
+        self.workers = workers
+        self.startup_timeout = startup_timeout
+        self.predict_timeout = predict_timeout
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.dead = set()
+        self.restarts = 0
+
+        # Split the cores between workers rather than let every one of them
+        # spin up a thread per core
+        self.num_threads = num_threads or max(1, (os.cpu_count() or 1) // workers)
+        self.authkey = os.urandom(16)
+        self.addresses = [
+            os.path.join(tempfile.gettempdir(), f"court-finder-inference-{uuid.uuid4().hex[:12]}.sock")
+            for _ in range(workers)
+        ]
+        self.processes = [self.start_worker(address) for address in self.addresses]
+        # Workers are stopped once a swapped-out model is no longer referenced;
+        # restarts replace entries in the same list
+        self.finalizer = weakref.finalize(self, stop_workers, self.processes, self.addresses)
+
+        try:
+            for slot in range(workers):
+                self.idle.put((slot, self.connect(slot)))
+        except RuntimeError:
+            self.finalizer()
+            raise
+        print(f"Started {workers} {backend_name} inference workers with {self.num_threads} threads each")
+
+    def start_worker(self, address):
+        server = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inference_server.py')
+        return subprocess.Popen(
+            [sys.executable, server, '--address', address, '--backend', self.backend_name,
+             '--model', self.model_path, '--threads', str(self.num_threads)],
+            env={**os.environ, 'INFERENCE_AUTHKEY': self.authkey.hex()},
+        )
+
+    def connect(self, slot):
+        process, address = self.processes[slot], self.addresses[slot]
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"Inference worker exited with code {process.returncode}")
+            try:
+                return Client(address, authkey=self.authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Inference worker did not start within {self.startup_timeout}s")
+                time.sleep(0.1)
+
+    def restart(self, slot):
+        # Replaces a crashed or stuck worker; a worker that fails to come back
+        # is left out, and once every worker is out predict fails fast
+        process = self.processes[slot]
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        if os.path.exists(self.addresses[slot]):
+            os.remove(self.addresses[slot])
+
+        self.processes[slot] = self.start_worker(self.addresses[slot])
+        try:
+            conn = self.connect(slot)
+        except RuntimeError as e:
+            print(f"Inference worker {slot} could not be restarted: {e}")
+            with self.lock:
+                self.dead.add(slot)
+            return
+        with self.lock:
+            self.restarts += 1
+        print(f"Restarted inference worker {slot}")
+        self.idle.put((slot, conn))
+
+    def predict(self, batch):
+        deadline = time.monotonic() + self.startup_timeout + self.predict_timeout
+        while True:
+            if len(self.dead) == self.workers:
+                raise RuntimeError("All inference workers have exited")
+            try:
+                slot, conn = self.idle.get(timeout=1)
+                break
+            except queue.Empty:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("No inference worker became available")
+
+        try:
+            conn.send(np.ascontiguousarray(batch))
+            if not conn.poll(self.predict_timeout):
+                raise TimeoutError(f"Inference worker {slot} did not answer within {self.predict_timeout}s")
+            scores = conn.recv()
+        except (EOFError, OSError) as e:
+            # The connection is dropped and the worker replaced in the background
+            conn.close()
+            threading.Thread(target=self.restart, args=(slot,), daemon=True).start()
+            raise RuntimeError(f"Inference worker failed: {e!r}")
+        self.idle.put((slot, conn))
+        if isinstance(scores, Exception):
+            raise scores
+        return scores
+
+    def stats(self):
+        with self.lock:
+            return {"workers": self.workers, "idle": self.idle.qsize(), "dead": len(self.dead), "restarts": self.restarts}
+
+    def close(self):
+        self.finalizer()
+
+BACKENDS = {
+    'keras': KerasBackend,
+    'tflite': TFLiteBackend,
+    'onnx': OnnxBackend,
+}
+
+def load_backend(name, model_path, num_threads=None, workers=0):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {', '.join(BACKENDS)}")
+    if workers:
+        return WorkerPoolBackend(name, model_path, workers, num_threads)
+    print(f"Loading {name} model from {model_path}")
+    if name == 'keras':
+        return KerasBackend(model_path)
+    return BACKENDS[name](model_path, num_threads=num_threads)
@@ -0,0 +1,45 @@
+import argparse
+import os
+import time
+from multiprocessing.connection import Listener
+import numpy as np
+
+from inference import load_backend
+
+# One model per process, answering predict calls for uint8 batches over a
+# local socket; WorkerPoolBackend starts one of these per worker
+def serve(address, authkey, backend_name, model_path, num_threads=None, warmup_batch_size=32):
+    if backend_name == 'keras' and num_threads:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    backend = load_backend(backend_name, model_path, num_threads)
+    start = time.perf_counter()
+    backend.predict(np.zeros((warmup_batch_size, 150, 150, 3), dtype=np.uint8))
+    print(f"Inference worker {os.getpid()} warmed up in {time.perf_counter() - start:.1f}s")
+
+    with Listener(address, authkey=authkey) as listener:
+        while True:
+            with listener.accept() as conn:
+                while True:
+                    try:
+                        batch = conn.recv()
+                    except EOFError:
+                        break
+                    try:
+                        conn.send(backend.predict(batch))
+                    except Exception as e:
+                        conn.send(e)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve court classifier predictions over a local socket")
+    parser.add_argument('--address', required=True, help="Unix socket path")
+    parser.add_argument('--backend', default='keras')
+    parser.add_argument('--model', required=True)
+    parser.add_argument('--threads', type=int, default=0)
+    parser.add_argument('--warmup-batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    authkey = bytes.fromhex(os.environ['INFERENCE_AUTHKEY'])
+    serve(args.address, authkey, args.backend, args.model, args.threads or None, args.warmup_batch_size)
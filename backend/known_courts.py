@@ -0,0 +1,106 @@
+import csv
+import math
+import numpy as np
+
+EARTH_RADIUS = 6371e3
+
+class KnownCourts:
+    # Courts are bucketed into a fixed lat/lon grid and sorted by bucket key,
+    # so a box query is one searchsorted per bucket row over packed arrays
+    def __init__(self, lats, lons, details, bucket_size=0.01):
+        self.bucket_size = bucket_size
+        self.columns = math.ceil(360 / bucket_size) + 1
+        keys = self.get_keys(lats, lons)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.lats = lats[order]
+        self.lons = lons[order]
+        self.details = [details[i] for i in order.tolist()]
+
+    @classmethod
+    def load(cls, csv_path, **kwargs):
+        lats, lons, details = [], [], []
+        with open(csv_path, newline='') as f:
+            for row in csv.DictReader(f):
+                try:
+                    lat, lon = float(row['latitude']), float(row['longitude'])
+                except (TypeError, ValueError):
+                    continue
+                if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                    continue
+                lats.append(lat)
+                lons.append(lon)
+                details.append({
+                    "address": row.get('address') or None,
+                    "city": row.get('city') or None,
+                    "count": int(row['count']) if (row.get('count') or '').isdigit() else None,
+                    # The CSV only flags clay and grass, so anything else is unknown rather than hard
+                    "surface": 'clay' if row.get('clay') == 'True' else 'grass' if row.get('grass') == 'True' else None,
+                    "indoor": row.get('indoor') == 'True',
+                    "lights": row.get('lights') == 'True',
+                })
+
+        print(f"Loaded {len(lats)} known courts from {csv_path}")
+        return cls(np.array(lats, dtype=np.float64), np.array(lons, dtype=np.float64), details, **kwargs)
+
+    def get_rows(self, lats):
+        return np.floor((np.asarray(lats) + 90) / self.bucket_size).astype(np.int64)
+
+    def get_cols(self, lons):
+        return np.floor((np.asarray(lons) + 180) / self.bucket_size).astype(np.int64)
+
+    def get_keys(self, lats, lons):
+        return self.get_rows(lats) * self.columns + self.get_cols(lons)
+
+    def find(self, top_left, bottom_right):
+        # Indices of the courts inside the box
+        lat_top, lon_left = top_left
+        lat_bottom, lon_right = bottom_right
+        rows = np.arange(self.get_rows(lat_bottom), self.get_rows(lat_top) + 1)
+        starts = np.searchsorted(self.keys, rows * self.columns + self.get_cols(lon_left), side='left')
+        ends = np.searchsorted(self.keys, rows * self.columns + self.get_cols(lon_right), side='right')
+        if not len(rows) or not (ends - starts).sum():
+            return np.empty(0, dtype=np.int64)
+
+        indices = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends) if end > start])
+        inside = (
+            (self.lats[indices] <= lat_top) & (self.lats[indices] >= lat_bottom)
+            & (self.lons[indices] >= lon_left) & (self.lons[indices] <= lon_right)
+        )
+        return indices[inside]
+
+    def query(self, top_left, bottom_right):
+        return [
+            {"latitude": float(self.lats[i]), "longitude": float(self.lons[i]), "known": True, **self.details[i]}
+            for i in self.find(top_left, bottom_right).tolist()
+        ]
+
+    def near(self, points, radius):
+        # Which of the (lat, lon) points have a known court within radius meters
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        near = np.zeros(len(points), dtype=bool)
+        if not len(points):
+            return near
+
+        margin_lat = math.degrees(radius / EARTH_RADIUS)
+        margin_lon = margin_lat / max(math.cos(math.radians(np.abs(points[:, 0]).max())), 0.01)
+        indices = self.find(
+            (points[:, 0].max() + margin_lat, points[:, 1].min() - margin_lon),
+            (points[:, 0].min() - margin_lat, points[:, 1].max() + margin_lon),
+        )
+        if not len(indices):
+            return near
+
+        # Equirectangular distances are plenty at a few hundred meters
+        court_lats = np.radians(self.lats[indices])
+        court_lons = np.radians(self.lons[indices])
+        for start in range(0, len(points), 1024):
+            lats = np.radians(points[start:start + 1024, 0])[:, None]
+            lons = np.radians(points[start:start + 1024, 1])[:, None]
+            dx = (court_lons - lons) * np.cos((court_lats + lats) / 2)
+            dy = court_lats - lats
+            near[start:start + 1024] = (np.hypot(dx, dy) * EARTH_RADIUS <= radius).any(axis=1)
+        return near
+
+    def stats(self):
+        return {"courts": len(self.lats), "bucket_size": self.bucket_size}
@@ -1,212 +1,975 @@
 from flask import Flask, request, jsonify
-from tensorflow.keras.models import load_model
 from flask_cors import CORS
-from tensorflow.keras.preprocessing import image
 from PIL import Image
 import numpy as np
-import aiohttp
 import asyncio
+import threading
+import atexit
+import time
 from io import BytesIO
 import os
 from dotenv import load_dotenv
 import math
+import ipaddress
 from flask_socketio import SocketIO, emit
-from geopy.distance import geodesic
-import boto3
+from tile_fetcher import TileFetcher, STATIC_MAPS_URL
+from tile_cache import TileCache
+from prediction_cache import PredictionCache
+from scan_jobs import ScanJobs
+from model_manager import ModelManager
+from admission import AdmissionController, AdmissionError
+from cascade import Cascade
+from heatmap import HeatmapModel, find_peaks, HEATMAP_STRIDE, WINDOW_SIZE
+from pending_cells import PendingCells
+from pyramid import get_coarse_tiles, get_cell_boxes, get_cells_per_tile
+from quadtree import get_quadrant_boxes, get_node_detections, RefinementBudget
+from inference import load_backend
+from known_courts import KnownCourts
 
 load_dotenv()
 app = Flask(__name__)
 CORS(app)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-BUCKET_NAME = 'courtfind-model'
 MODEL_FILENAME = 'tennis_court_classifier.keras'
-LOCAL_MODEL_PATH = '/tmp/tennis_court_classifier.keras'
+LOCAL_MODEL_PATH = os.getenv('LOCAL_MODEL_PATH', '/tmp/tennis_court_classifier.keras')
+
+# keras, tflite or onnx; the last two load an artifact written by export_model.py
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'keras')
+INFERENCE_MODEL_PATH = os.getenv('INFERENCE_MODEL_PATH', LOCAL_MODEL_PATH)
+INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', 0)) or None
+# With INFERENCE_WORKERS set the model runs in that many inference_server.py
+# processes instead of this one, and each scan keeps a batch in flight per worker
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', 0))
+SCORE_CONCURRENCY = int(os.getenv('SCORE_CONCURRENCY', 0)) or max(1, INFERENCE_WORKERS)
+# Batches from concurrent scans are merged into model calls of up to
+# MICRO_BATCH_SIZE rows, waiting at most MICRO_BATCH_WAIT_MS; 0 turns it off
+MICRO_BATCH_SIZE = int(os.getenv('MICRO_BATCH_SIZE', 128))
+MICRO_BATCH_WAIT_MS = float(os.getenv('MICRO_BATCH_WAIT_MS', 5))
 
 GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
+BATCH_SIZE = int(os.getenv('BATCH_SIZE', 32))
+QUEUE_SIZE = int(os.getenv('QUEUE_SIZE', 64))
+PROGRESS_INTERVAL = float(os.getenv('PROGRESS_INTERVAL', 0.5))
 
-def download_model_from_s3(bucket_name, model_filename, local_model_path):
-    print("Downloading model from S3...")
-    s3 = boto3.client('s3')
-    s3.download_file(bucket_name, model_filename, local_model_path)
-    print("Model downloaded successfully")
-    return load_model(local_model_path)
-
-# model = download_model_from_s3(BUCKET_NAME, MODEL_FILENAME, LOCAL_MODEL_PATH)
-model = load_model(LOCAL_MODEL_PATH)
-
-async def fetch_image(session, url):
-    async with session.get(url) as response:
-        if response.status == 200:
-            img_data = await response.read()
-            img = Image.open(BytesIO(img_data)).convert('RGB')
-            return img
-        else:
-            return None
-
-async def get_google_maps_images_async(coords):
-    images = []
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        for lat, lon in coords:
-            url = f"https://maps.googleapis.com/maps/api/staticmap?center={lat},{lon}&zoom=19&size=1000x1000&maptype=satellite&key={GOOGLE_MAPS_API_KEY}"
-            tasks.append(fetch_image(session, url))
-        images = await asyncio.gather(*tasks)
-    return images
-
-def combine_close_courts(tennis_courts, new_court, proximity=200):
-    for court in tennis_courts:
-        distance = geodesic((court["latitude"], court["longitude"]), (new_court["latitude"], new_court["longitude"])).meters
-        if distance < proximity:
-            court["latitude"] = (court["latitude"] + new_court["latitude"]) / 2
-            court["longitude"] = (court["longitude"] + new_court["longitude"]) / 2
-            return tennis_courts
-    tennis_courts.append(new_court)
-    return tennis_courts
+MODEL_INPUT_SIZE = (150, 150)
+BOTTOM_CROP = 0.03
 
-def preprocess_image(img):
-    try:
-        if isinstance(img, Image.Image):
-            img = np.array(img)
-        
-        if img is None:
-            print(f"Error: Failed to read image.")
-            return None
+# Every tile covers the same ground as a 640px zoom-19 tile, the largest the
+# Static Maps API serves without scale=2 and what the training tiles were:
+# about 148m at 39N, one 140m cell. Each zoom level down halves the pixels
+# needed; zoom 18 at 320px still leaves 155px quadrants after the bottom crop,
+# just above the model's 150px input.
+MAX_STATIC_MAPS_SIZE = 640
+TILE_ZOOM = int(os.getenv('TILE_ZOOM', 18))
+if not 17 <= TILE_ZOOM <= 19:
+    raise ValueError(f"TILE_ZOOM must be 17, 18 or 19: higher zooms need tiles over {MAX_STATIC_MAPS_SIZE}px, "
+                     f"lower ones leave less than {MODEL_INPUT_SIZE[0]}px per cell")
+TILE_SIZE = MAX_STATIC_MAPS_SIZE // 2 ** (19 - TILE_ZOOM)
+
+# Tiles scoring between REFINE_LOW and REFINE_HIGH are split into quadrants,
+# and uncertain quadrants again, up to REFINE_MAX_DEPTH levels and at most
+# REFINE_BUDGET extra predictions per scan. Deeper nodes than the tile has
+# pixels for (one level at 320px) would only be upscaled, so that is both the
+# default and the limit.
+MAX_REFINE_DEPTH = max(0, int(math.log2(TILE_SIZE * (1 - BOTTOM_CROP) / MODEL_INPUT_SIZE[0])))
+REFINE_LOW = float(os.getenv('REFINE_LOW', 0.3))
+REFINE_HIGH = float(os.getenv('REFINE_HIGH', 0.9))
+REFINE_MAX_DEPTH = int(os.getenv('REFINE_MAX_DEPTH', MAX_REFINE_DEPTH))
+if REFINE_MAX_DEPTH > MAX_REFINE_DEPTH:
+    print(f"REFINE_MAX_DEPTH {REFINE_MAX_DEPTH} needs bigger tiles than {TILE_SIZE}px, using {MAX_REFINE_DEPTH}")
+    REFINE_MAX_DEPTH = MAX_REFINE_DEPTH
+REFINE_BUDGET = int(os.getenv('REFINE_BUDGET', 2000))
+
+# Pyramid scans fetch one coarse tile per block of cells (8x8 at zoom 16 and
+# 640px around 39N, fewer towards the poles) and only fetch fine tiles for the
+# cells that look like candidates there. Candidates come from COARSE_MODEL_PATH, a
+# classifier trained on coarse cell crops, when one is set, and from
+# coarse_cascade's cheap checks otherwise.
+COARSE_ZOOM = int(os.getenv('COARSE_ZOOM', 16))
+COARSE_TILE_SIZE = int(os.getenv('COARSE_TILE_SIZE', MAX_STATIC_MAPS_SIZE))
+if COARSE_TILE_SIZE > MAX_STATIC_MAPS_SIZE:
+    raise ValueError(f"COARSE_TILE_SIZE can be at most {MAX_STATIC_MAPS_SIZE}px")
+# The most cells a coarse tile holds across, at the equator
+COARSE_CELLS = int(get_cells_per_tile(0, COARSE_ZOOM, COARSE_TILE_SIZE))
+COARSE_MODEL_PATH = os.getenv('COARSE_MODEL_PATH')
+COARSE_BACKEND = os.getenv('COARSE_BACKEND', 'keras')
+COARSE_THRESHOLD = float(os.getenv('COARSE_THRESHOLD', 0.2))
+
+# tiles scores every cell and refines uncertain ones; dense stitches the cells into a
+# mosaic and finds courts as peaks in a heatmap from the convolutional model;
+# pyramid screens the area with coarse tiles before scoring cells as tiles does
+SCAN_MODE = os.getenv('SCAN_MODE', 'tiles')
+HEATMAP_BLOCK_SIZE = int(os.getenv('HEATMAP_BLOCK_SIZE', 512))
+
+EARTH_RADIUS = 6371e3
+MAX_GRID_LATITUDE = 85
+
+# Courts from data/tennis_courts.csv are answered straight from an index; with
+# SKIP_KNOWN_COURTS only cells without one within KNOWN_COURT_RADIUS are scanned
+KNOWN_COURTS_PATH = os.getenv('KNOWN_COURTS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'tennis_courts.csv'))
+SKIP_KNOWN_COURTS = os.getenv('SKIP_KNOWN_COURTS', 'false').lower() == 'true'
+KNOWN_COURT_RADIUS = float(os.getenv('KNOWN_COURT_RADIUS', 100))
 
-        height, width = img.shape[:2]
-        meters_per_pixel = 140 / height  # Assuming 140 meters is the height of the image
-        crop_meters = 0.03 * 140
-        crop_pixels = int(crop_meters / meters_per_pixel)
+# Rough per-scan memory: compressed tiles waiting in the fetch queue, one batch
+# of decoded tiles and the per-cell coordinates, ids and scores
+TILE_BYTES_ESTIMATE = 64 * 1024
+CELL_BYTES_ESTIMATE = 512
+# Dense scans also hold the whole mosaic, MODEL_INPUT_SIZE pixels per cell, and
+# the float32 activations of VGG16's first two 64-channel convs over one block
+HEATMAP_ACTIVATION_BYTES = (HEATMAP_BLOCK_SIZE + WINDOW_SIZE) ** 2 * 64 * 4 * 2
 
-        cropped_img = img[:height - crop_pixels, :]
+# Cheap checks that turn away blank placeholders, featureless water and tiles
+# without a single bright line before they reach the CNN. Off by default: turn
+# stages on (e.g. CASCADE_STAGES=placeholder,flat,lines) only with thresholds
+# that evaluate_cascade.py has checked against real validation tiles
+CASCADE_STAGES = [name for name in os.getenv('CASCADE_STAGES', '').split(',') if name]
+cascade = Cascade(
+    CASCADE_STAGES,
+    flat_std=float(os.getenv('CASCADE_FLAT_STD', 6)),
+    min_line_fraction=float(os.getenv('CASCADE_MIN_LINE_FRACTION', 0.002)),
+) if CASCADE_STAGES else None
 
-        img_pil = Image.fromarray(cropped_img)
-        img_pil = img_pil.resize((150, 150))
+# Coarse crops are a cell shrunk to a few dozen pixels, so they get their own
+# stages and thresholds; check them with evaluate_cascade.py --coarse-pixels
+COARSE_CASCADE_STAGES = [name for name in os.getenv('COARSE_CASCADE_STAGES', '').split(',') if name]
+coarse_cascade = Cascade(
+    COARSE_CASCADE_STAGES,
+    flat_std=float(os.getenv('COARSE_CASCADE_FLAT_STD', 6)),
+    min_line_fraction=float(os.getenv('COARSE_CASCADE_MIN_LINE_FRACTION', 0.002)),
+) if COARSE_CASCADE_STAGES else None
 
-        img_array = image.img_to_array(img_pil)
-        img_array = np.expand_dims(img_array, axis=0)
-        img_array /= 255.0  # Rescale pixel values
+def get_prediction_version(loaded):
+    version = f"{loaded.model_hash}/refine({REFINE_LOW},{REFINE_HIGH},{REFINE_MAX_DEPTH})"
+    return f"{version}/{cascade.signature}" if cascade else version
 
-        return img_array
+# Scanned cells are answered from the store until they are RESULTS_TTL seconds
+# old (0 keeps them forever), then fetched and scored again. Results of other
+# model versions stay until they age out or RESULTS_MAX_CELLS (0 for no cap)
+# pushes them out, oldest first
+RESULTS_TTL = float(os.getenv('RESULTS_TTL', 30 * 24 * 3600))
+prediction_cache = PredictionCache(
+    os.getenv('PREDICTION_CACHE_PATH', '/tmp/court-finder-predictions.sqlite'),
+    max_age=RESULTS_TTL or None,
+    max_rows=int(os.getenv('RESULTS_MAX_CELLS', 0)) or None,
+)
+
+# With MODEL_STORE_BUCKET set (production uses courtfind-model) the model is
+# pulled from the store, otherwise INFERENCE_MODEL_PATH is served as is
+MODEL_STORE_BUCKET = os.getenv('MODEL_STORE_BUCKET')
+MODEL_VERSION = os.getenv('MODEL_VERSION')
+MODEL_POLL_INTERVAL = float(os.getenv('MODEL_POLL_INTERVAL', 0))
+MODEL_READY_TIMEOUT = float(os.getenv('MODEL_READY_TIMEOUT', 300))
+MODEL_ADMIN_TOKEN = os.getenv('MODEL_ADMIN_TOKEN')
+
+model_manager = ModelManager(
+    INFERENCE_BACKEND,
+    os.getenv('MODEL_ARTIFACT', MODEL_FILENAME),
+    os.getenv('MODEL_CACHE_DIR', '/tmp/court-finder-models'),
+    bucket=MODEL_STORE_BUCKET,
+    endpoint_url=os.getenv('MODEL_STORE_ENDPOINT'),
+    local_path=INFERENCE_MODEL_PATH,
+    num_threads=INFERENCE_THREADS,
+    workers=INFERENCE_WORKERS,
+    warmup_batch_size=BATCH_SIZE,
+    micro_batch_size=MICRO_BATCH_SIZE,
+    micro_batch_wait=MICRO_BATCH_WAIT_MS / 1000,
+    on_swap=lambda loaded: prediction_cache.set_model_version(get_prediction_version(loaded)),
+)
+model_manager.load_in_background(MODEL_VERSION)
+if MODEL_STORE_BUCKET and MODEL_POLL_INTERVAL and not MODEL_VERSION:
+    model_manager.watch(MODEL_POLL_INTERVAL)
+
+tile_cache = TileCache(
+    os.getenv('TILE_CACHE_DIR', '/tmp/court-finder-tiles'),
+    max_bytes=int(os.getenv('TILE_CACHE_MAX_MB', 2048)) * 1024 ** 2,
+    memory_items=int(os.getenv('TILE_CACHE_MEMORY_ITEMS', 256)),
+)
+
+fetcher = TileFetcher(
+    GOOGLE_MAPS_API_KEY,
+    base_url=os.getenv('STATIC_MAPS_URL', STATIC_MAPS_URL),
+    pool_size=int(os.getenv('FETCH_POOL_SIZE', 64)),
+    max_in_flight=int(os.getenv('FETCH_MAX_IN_FLIGHT', 32)),
+    max_retries=int(os.getenv('FETCH_RETRIES', 4)),
+    backoff=float(os.getenv('FETCH_BACKOFF', 0.5)),
+    timeout=float(os.getenv('FETCH_TIMEOUT', 15)),
+    cache=tile_cache,
+    zoom=TILE_ZOOM,
+    size=TILE_SIZE,
+    image_format=os.getenv('TILE_FORMAT', 'jpg'),
+)
+
+coarse_model = load_backend(COARSE_BACKEND, COARSE_MODEL_PATH, INFERENCE_THREADS) if SCAN_MODE == 'pyramid' and COARSE_MODEL_PATH else None
+known_courts = KnownCourts.load(KNOWN_COURTS_PATH) if os.path.exists(KNOWN_COURTS_PATH) else None
+pending_cells = PendingCells()
+pyramid_counters = {"coarse_tiles": 0, "cells": 0, "candidates": 0}
+
+batch_buffers = threading.local()
+heatmap_models = {}
+heatmap_lock = threading.Lock()
+
+# One event loop for the life of the process, so the fetcher's connection
+# pool survives between requests
+scan_loop = asyncio.new_event_loop()
+threading.Thread(target=scan_loop.run_forever, daemon=True).start()
+atexit.register(lambda: asyncio.run_coroutine_threadsafe(fetcher.close(), scan_loop).result(timeout=5))
+
+def decode_image(img_data):
+    # A tile that can't be decoded counts as missing rather than failing the scan
+    if img_data is None:
+        return None
+    try:
+        img = Image.open(BytesIO(img_data))
+        img.load()
+        return img if img.mode == 'RGB' else img.convert('RGB')
     except Exception as e:
-        print(f"Error processing image: {e}")
+        print(f"Error decoding image: {e}")
         return None
 
-def is_tennis_court(prediction):
-    return prediction[0][0] >= 0.5
+async def fetch_tiles(coords, indices, queue, zoom=None, size=None):
+    pending = iter(indices)
 
-def get_grid_coordinates(top_left, bottom_right, box_size=140):
-    R = 6371e3
-    lat_start, lon_start = top_left
-    lat_end, lon_end = bottom_right
-    coords = []
+    async def worker():
+        for i in pending:
+            img_data = await fetcher.fetch(*coords[i], zoom, size)
+            await queue.put((i, img_data))
 
-    lat_start_rad = math.radians(lat_start)
-    lon_start_rad = math.radians(lon_start)
-    lat_end_rad = math.radians(lat_end)
-    lon_end_rad = math.radians(lon_end)
+    try:
+        await asyncio.gather(*(worker() for _ in range(min(fetcher.max_in_flight, len(indices)))))
+    finally:
+        await queue.put(None)
 
-    d_lat = box_size / R
-    d_lon = box_size / (R * math.cos((lat_start_rad + lat_end_rad) / 2))
+async def get_tile_batches(queue, batch_size=BATCH_SIZE):
+    # Whatever is already queued, up to batch_size, until fetch_tiles is done
+    finished = False
+    while not finished:
+        tiles = [await queue.get()]
+        while len(tiles) < batch_size and not queue.empty():
+            tiles.append(queue.get_nowait())
 
-    lat = lat_start_rad
-    while lat > lat_end_rad:
-        lon = lon_start_rad
-        while lon < lon_end_rad:
-            center_lat = lat - d_lat / 2
-            center_lon = lon + d_lon / 2
+        if tiles[-1] is None:
+            finished = True
+            tiles.pop()
+        if tiles:
+            yield tiles
 
-            coords.append((math.degrees(center_lat), math.degrees(center_lon)))
+def haversine(lat, lon, lats, lons):
+    lat, lon, lats, lons = map(np.radians, (lat, lon, lats, lons))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
 
-            lon += d_lon
-        lat -= d_lat
+def merge_courts(detections, proximity=200):
+    # Detections are hashed into proximity-sized cells, so each one is only
+    # compared against clusters in its 3x3 neighbourhood. Sorting first makes
+    # the result independent of the order detections arrived in.
+    points = np.array(sorted(set(detections)), dtype=np.float64).reshape(-1, 2)
+    if not len(points):
+        return []
 
-    return coords
-    
-def divide_image_into_quadrants(img):
-    width, height = img.size
-    mid_width = width // 2
-    mid_height = height // 2
-    
-    quadrant1 = img.crop((0, 0, mid_width, mid_height))
-    quadrant2 = img.crop((mid_width, 0, width, mid_height))
-    quadrant3 = img.crop((0, mid_height, mid_width, height))
-    quadrant4 = img.crop((mid_width, mid_height, width, height))
-    
-    return [quadrant1, quadrant2, quadrant3, quadrant4]
+    meters_per_lon = math.radians(1) * EARTH_RADIUS * math.cos(math.radians(points[:, 0].mean()))
+    meters_per_lat = math.radians(1) * EARTH_RADIUS
+
+    def get_bucket(lat, lon):
+        return (int(lat * meters_per_lat // proximity), int(lon * meters_per_lon // proximity))
+
+    sums = []
+    counts = []
+    buckets = {}
+    for lat, lon in points:
+        row, col = get_bucket(lat, lon)
+        candidates = [k for dr in (-1, 0, 1) for dc in (-1, 0, 1) for k in buckets.get((row + dr, col + dc), ())]
+
+        if candidates:
+            centers = np.array([sums[k] for k in candidates]) / np.array([counts[k] for k in candidates])[:, None]
+            distances = haversine(lat, lon, centers[:, 0], centers[:, 1])
+            nearest = int(np.argmin(distances))
+            if distances[nearest] < proximity:
+                k = candidates[nearest]
+                old_bucket = get_bucket(*(sums[k] / counts[k]))
+                sums[k] += (lat, lon)
+                counts[k] += 1
+                new_bucket = get_bucket(*(sums[k] / counts[k]))
+                if new_bucket != old_bucket:
+                    buckets[old_bucket].remove(k)
+                    buckets.setdefault(new_bucket, []).append(k)
+                continue
+
+        buckets.setdefault((row, col), []).append(len(sums))
+        sums.append(np.array([lat, lon]))
+        counts.append(1)
+
+    return [
+        {"latitude": float(total[0] / count), "longitude": float(total[1] / count)}
+        for total, count in zip(sums, counts)
+    ]
+
+def get_batch_buffer(size):
+    # Each scoring thread reuses one uint8 buffer, so the hot loop doesn't
+    # allocate a fresh batch per tile
+    buffer = getattr(batch_buffers, 'buffer', None)
+    if buffer is None or len(buffer) < size:
+        buffer = np.empty((max(size, BATCH_SIZE), *MODEL_INPUT_SIZE, 3), dtype=np.uint8)
+        batch_buffers.buffer = buffer
+    return buffer[:size]
+
+def get_model_box(box):
+    # Drops the bottom 3% of the region, where Google draws its attribution
+    left, top, right, bottom = box
+    return (left, top, right, bottom - int(BOTTOM_CROP * (bottom - top)))
+
+def preprocess_regions(regions):
+    batch = get_batch_buffer(len(regions))
+    indices = []
+    for i, (img, box) in enumerate(regions):
+        try:
+            batch[len(indices)] = img.resize(MODEL_INPUT_SIZE, box=box)
+            indices.append(i)
+        except Exception as e:
+            print(f"Error processing image: {e}")
+
+    return indices, batch[:len(indices)]
+
+def preprocess_batch(images):
+    keys = [i for i, img in enumerate(images) if img is not None]
+    indices, batch = preprocess_regions([(images[i], get_model_box((0, 0, *images[i].size))) for i in keys])
+    return [keys[k] for k in indices], batch
+
+def predict_in_batches(batch, model, batch_size=BATCH_SIZE):
+    scores = []
+    for start in range(0, len(batch), batch_size):
+        scores.append(model.predict(batch[start:start + batch_size]))
+
+    if not scores:
+        return np.empty(0, dtype=np.float32)
+    return np.concatenate(scores)
+
+def get_grid_rows(top_left, bottom_right, box_size=140):
+    # Rows are fixed bands of latitude and every row is cut into columns from
+    # the antimeridian, so any two requests share the cells they overlap
+    lat_top, lon_left = top_left
+    lat_bottom, lon_right = bottom_right
+    lat_top = min(lat_top, MAX_GRID_LATITUDE)
+    lat_bottom = max(lat_bottom, -MAX_GRID_LATITUDE)
+
+    d_lat = math.degrees(box_size / EARTH_RADIUS)
+    rows = np.arange(math.floor(lat_top / d_lat), math.floor(lat_bottom / d_lat) - 1, -1, dtype=np.int64)
+    center_lats = (rows + 0.5) * d_lat
+    d_lons = np.degrees(box_size / (EARTH_RADIUS * np.cos(np.radians(center_lats))))
 
-def get_quadrant_coordinates(center_coords, quadrant_index, box_size=140):
+    first_cols = np.floor((lon_left + 180) / d_lons).astype(np.int64)
+    last_cols = np.floor((lon_right + 180) / d_lons).astype(np.int64)
+    counts = np.maximum(last_cols - first_cols + 1, 0)
+    return rows, center_lats, d_lons, first_cols, counts
+
+def count_grid_cells(top_left, bottom_right, box_size=140):
+    # Only touches one entry per row, so it is cheap even for areas far too big to scan
+    return int(get_grid_rows(top_left, bottom_right, box_size)[-1].sum())
+
+def get_grid_cells(top_left, bottom_right, box_size=140):
+    rows, center_lats, d_lons, first_cols, counts = get_grid_rows(top_left, bottom_right, box_size)
+
+    row_index = np.repeat(np.arange(len(rows)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cols = first_cols[row_index] + offsets
+
+    cells = np.stack([rows[row_index], cols], axis=1)
+    centers = np.stack([center_lats[row_index], (cols + 0.5) * d_lons[row_index] - 180], axis=1)
+    return cells, centers
+
+def get_grid_coordinates(top_left, bottom_right, box_size=140):
+    cells, centers = get_grid_cells(top_left, bottom_right, box_size)
+    return [tuple(center) for center in centers.tolist()]
+
+def get_cell_id(row, col, box_size=140):
+    return f"{box_size}/{row}/{col}"
+
+def get_cell_bounds(center_coords, box_size=140):
     lat, lon = center_coords
-    delta_lat = box_size / 4 / 111111  # 111111 meters per degree latitude
-    delta_lon = box_size / 4 / (111111 * math.cos(math.radians(lat)))
-    
-    if quadrant_index == 0:
-        return (lat + delta_lat, lon - delta_lon)
-    elif quadrant_index == 1:
-        return (lat + delta_lat, lon + delta_lon)
-    elif quadrant_index == 2:
-        return (lat - delta_lat, lon - delta_lon)
-    elif quadrant_index == 3:
-        return (lat - delta_lat, lon + delta_lon)
+    d_lat = math.degrees(box_size / EARTH_RADIUS) / 2
+    d_lon = math.degrees(box_size / (EARTH_RADIUS * math.cos(math.radians(lat)))) / 2
+    return (lat - d_lat, lat + d_lat, lon - d_lon, lon + d_lon)
     
+def is_uncertain(score):
+    return REFINE_LOW <= score < REFINE_HIGH
+
+def refine_images(images, results, model, budget=None):
+    # Breadth-first down the quadtree, one batch per level; each result's
+    # second element maps node paths to their scores
+    frontier = [(i, '', get_model_box((0, 0, *images[i].size))) for i, (score, _) in results.items() if is_uncertain(score)]
+    for depth in range(REFINE_MAX_DEPTH):
+        if budget is not None:
+            frontier = frontier[:budget.take(len(frontier) * 4) // 4]
+        nodes = [(i, path + str(j), child) for i, path, box in frontier for j, child in enumerate(get_quadrant_boxes(box))]
+        if not nodes:
+            break
+
+        batch_indices, batch = preprocess_regions([(images[i], box) for i, _, box in nodes])
+        frontier = []
+        for k, score in zip(batch_indices, predict_in_batches(batch, model)):
+            i, path, box = nodes[k]
+            results[i][1][path] = float(score)
+            if is_uncertain(score):
+                frontier.append(nodes[k])
+
+def score_images(images, model, budget=None):
+    indices, batch = preprocess_batch(images)
+    keep = cascade.filter(batch) if cascade else np.ones(len(batch), dtype=bool)
+    scores = np.zeros(len(batch), dtype=np.float32)
+    if keep.any():
+        scores[keep] = predict_in_batches(batch if keep.all() else batch[keep], model)
+
+    results = {i: (float(score), {}) for i, score in zip(indices, scores)}
+    refine_images(images, results, model, budget)
+    return {i: (score, nodes or None) for i, (score, nodes) in results.items()}
+
+def decode_and_score(tiles, model, budget=None):
+    images = [decode_image(img_data) for _, img_data in tiles]
+    results = score_images(images, model, budget)
+    return {tiles[k][0]: result for k, result in results.items()}
+
+async def score_tiles(queue, model, on_scored=None, concurrency=SCORE_CONCURRENCY, budget=None):
+    loop = asyncio.get_running_loop()
+    results = {}
+    scoring = {}
+    finished = False
+
+    while not finished or scoring:
+        if not finished and len(scoring) < concurrency:
+            tiles = [await queue.get()]
+            while len(tiles) < BATCH_SIZE and not queue.empty():
+                tiles.append(queue.get_nowait())
+
+            if tiles[-1] is None:
+                finished = True
+                tiles.pop()
+
+            if tiles:
+                scoring[loop.run_in_executor(None, decode_and_score, tiles, model, budget)] = len(tiles)
+        else:
+            await asyncio.wait(scoring, return_when=asyncio.FIRST_COMPLETED)
+
+        for future in [future for future in scoring if future.done()]:
+            count = scoring.pop(future)
+            batch_results = future.result()
+            results.update(batch_results)
+            if on_scored is not None:
+                on_scored(count, batch_results)
+
+    return results
+
+def get_detections(coords, results):
+    detections = []
+    for i, (score, nodes) in results.items():
+        detections += get_node_detections(coords[i], score, nodes or {})
+    return detections
+
+def build_courts(coords, results):
+    return merge_courts(get_detections(coords, results), proximity=200)
+
+async def scan_region_async(coords, cell_ids, loaded, on_progress=None, on_detections=None):
+    version = get_prediction_version(loaded)
+    cached = await asyncio.to_thread(prediction_cache.get_many, cell_ids, version)
+    results = {i: cached[cell_id] for i, cell_id in enumerate(cell_ids) if cell_id in cached}
+
+    # Cells another scan is already working on are awaited instead of redone
+    owned, joined = pending_cells.claim(version, {i: cell_id for i, cell_id in enumerate(cell_ids) if i not in results})
+
+    scored = 0
+
+    def on_scored(count, batch_results):
+        nonlocal scored
+        scored += count
+        if on_detections is not None:
+            on_detections(get_detections(coords, batch_results))
+        if on_progress is not None:
+            on_progress(scored / len(coords) if coords else 1.0)
+        pending_cells.resolve(owned, batch_results)
+
+    on_scored(len(results), results)
+
+    try:
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        producer = asyncio.create_task(fetch_tiles(coords, list(owned), queue))
+        try:
+            new_results = await score_tiles(queue, loaded.backend, on_scored, budget=RefinementBudget(REFINE_BUDGET))
+        except Exception:
+            producer.cancel()
+            raise
+        await producer
+
+        new_predictions = {cell_ids[i]: result for i, result in new_results.items()}
+        bounds = {cell_ids[i]: get_cell_bounds(coords[i]) for i in new_results}
+        await asyncio.to_thread(prediction_cache.put_many, new_predictions, version, bounds)
+        results.update(new_results)
+    finally:
+        pending_cells.release(version, cell_ids, owned)
+
+    if joined:
+        joined_results = await pending_cells.join(joined)
+        on_scored(len(joined), joined_results)
+        results.update(joined_results)
+
+    return build_courts(coords, results)
+
+def get_heatmap_model(loaded):
+    # Built once per served model, from the same Keras artifact
+    with heatmap_lock:
+        if loaded.model_hash not in heatmap_models:
+            model_path = loaded.backend.model_path
+            if not model_path.endswith(('.keras', '.h5')):
+                raise ValueError(f"Dense scans need a Keras model, not {model_path}")
+            heatmap_models.clear()
+            heatmap_models[loaded.model_hash] = HeatmapModel(model_path, HEATMAP_BLOCK_SIZE)
+        return heatmap_models[loaded.model_hash]
+
+def get_mosaic_layout(coords, box_size=140):
+    # Each cell lands where its center is on the ground at MODEL_INPUT_SIZE
+    # pixels per box_size, so rows whose columns don't line up still do in the mosaic
+    centers = np.array(coords, dtype=np.float64)
+    d_lat = math.degrees(box_size / EARTH_RADIUS)
+    d_lon = math.degrees(box_size / (EARTH_RADIUS * math.cos(math.radians(centers[:, 0].mean()))))
+    origin = (centers[:, 0].max() + d_lat / 2, centers[:, 1].min() - d_lon / 2)
+
+    height, width = MODEL_INPUT_SIZE
+    ys = np.round((origin[0] - centers[:, 0]) / d_lat * height - height / 2).astype(np.int64)
+    xs = np.round((centers[:, 1] - origin[1]) / d_lon * width - width / 2).astype(np.int64)
+    return origin, (d_lat, d_lon), np.stack([ys, xs], axis=1)
+
+def paste_tiles(mosaic, positions, tiles):
+    height, width = MODEL_INPUT_SIZE
+    for i, img_data in tiles:
+        img = decode_image(img_data)
+        if img is None:
+            continue
+        y, x = positions[i]
+        mosaic[y:y + height, x:x + width] = np.asarray(img.resize(MODEL_INPUT_SIZE, box=get_model_box((0, 0, *img.size))))
+
+def get_peak_coordinates(peaks, origin, steps):
+    d_lat, d_lon = steps
+    height, width = MODEL_INPUT_SIZE
+    return [
+        (origin[0] - (row * HEATMAP_STRIDE + height / 2) / height * d_lat,
+         origin[1] + (col * HEATMAP_STRIDE + width / 2) / width * d_lon)
+        for row, col, score in peaks
+    ]
+
+def detect_in_mosaic(mosaic, heatmap_model):
+    return find_peaks(heatmap_model.predict_map(mosaic))
+
+async def scan_region_dense(coords, loaded, on_progress=None, on_detections=None):
+    loop = asyncio.get_running_loop()
+    heatmap_model = await asyncio.to_thread(get_heatmap_model, loaded)
+    if not coords:
+        return []
+
+    origin, steps, positions = get_mosaic_layout(coords)
+    mosaic = np.zeros((positions[:, 0].max() + MODEL_INPUT_SIZE[0], positions[:, 1].max() + MODEL_INPUT_SIZE[1], 3), dtype=np.uint8)
+
+    # Tiles are pasted in batches as they arrive, so only the mosaic is kept,
+    # never every compressed tile
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    producer = asyncio.create_task(fetch_tiles(coords, list(range(len(coords))), queue))
+    pasted = 0
+    try:
+        async for tiles in get_tile_batches(queue):
+            await loop.run_in_executor(None, paste_tiles, mosaic, positions, tiles)
+            pasted += len(tiles)
+            if on_progress is not None:
+                on_progress(0.5 * pasted / len(coords))
+    except Exception:
+        producer.cancel()
+        raise
+    await producer
+
+    peaks = await loop.run_in_executor(None, detect_in_mosaic, mosaic, heatmap_model)
+    detections = get_peak_coordinates(peaks, origin, steps)
+    if on_detections is not None:
+        on_detections(detections)
+    if on_progress is not None:
+        on_progress(1.0)
+    return merge_courts(detections, proximity=200)
+
+def find_candidates(tiles, centers, coarse_centers, block_index):
+    # Every cell stays a candidate unless its crop of a coarse tile says otherwise
+    keys = []
+    regions = []
+    for b, img_data in tiles:
+        img = decode_image(img_data)
+        if img is None:
+            continue
+        if img.size != (COARSE_TILE_SIZE, COARSE_TILE_SIZE):
+            img = img.resize((COARSE_TILE_SIZE, COARSE_TILE_SIZE))
+        members = np.flatnonzero(block_index == b)
+        for i, box in zip(members.tolist(), get_cell_boxes(centers[members], coarse_centers[b], COARSE_ZOOM, COARSE_TILE_SIZE)):
+            keys.append(i)
+            regions.append((img, box))
+
+    indices, batch = preprocess_regions(regions)
+    if coarse_model is not None:
+        keep = predict_in_batches(batch, coarse_model) >= COARSE_THRESHOLD
+    elif coarse_cascade is not None:
+        keep = coarse_cascade.filter(batch)
+    else:
+        keep = np.ones(len(batch), dtype=bool)
+    return {keys[k]: bool(flag) for k, flag in zip(indices, keep)}
+
+async def scan_region_pyramid(coords, cells, cell_ids, loaded, on_progress=None, on_detections=None):
+    loop = asyncio.get_running_loop()
+    if not coords:
+        return []
+    if coarse_model is None and coarse_cascade is None:
+        # Nothing would screen the coarse crops, so fetching them only costs requests
+        return await scan_region_async(coords, cell_ids, loaded, on_progress, on_detections)
+
+    centers = np.array(coords, dtype=np.float64)
+    coarse_centers, block_index = get_coarse_tiles(cells, centers, COARSE_ZOOM, COARSE_TILE_SIZE)
+    coarse_coords = [tuple(center) for center in coarse_centers.tolist()]
+
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    producer = asyncio.create_task(
+        fetch_tiles(coarse_coords, list(range(len(coarse_coords))), queue, COARSE_ZOOM, COARSE_TILE_SIZE)
+    )
+    flags = {}
+    screened = 0
+    try:
+        # A coarse tile holds up to COARSE_CELLS ** 2 crops, so take few at a time
+        async for tiles in get_tile_batches(queue, max(1, BATCH_SIZE // COARSE_CELLS ** 2)):
+            flags.update(await loop.run_in_executor(None, find_candidates, tiles, centers, coarse_centers, block_index))
+            screened += len(tiles)
+            if on_progress is not None:
+                on_progress(0.3 * screened / len(coarse_coords))
+    except Exception:
+        producer.cancel()
+        raise
+    await producer
+
+    candidates = [i for i in range(len(coords)) if flags.get(i, True)]
+    pyramid_counters["coarse_tiles"] += len(coarse_coords)
+    pyramid_counters["cells"] += len(coords)
+    pyramid_counters["candidates"] += len(candidates)
+    print(f"Pyramid scan: {len(candidates)} of {len(coords)} cells are candidates after {len(coarse_coords)} coarse tiles")
+
+    return await scan_region_async(
+        [coords[i] for i in candidates],
+        [cell_ids[i] for i in candidates],
+        loaded,
+        (lambda progress: on_progress(0.3 + 0.7 * progress)) if on_progress is not None else None,
+        on_detections,
+    )
+
+def add_known_courts(tennis_courts, known, proximity=200):
+    # Known courts keep their surveyed position; scanned ones only add courts
+    # that aren't already on the list
+    if not known:
+        return tennis_courts
+    known_lats = np.array([court["latitude"] for court in known])
+    known_lons = np.array([court["longitude"] for court in known])
+    new_courts = [
+        court for court in tennis_courts
+        if haversine(court["latitude"], court["longitude"], known_lats, known_lons).min() >= proximity
+    ]
+    return known + new_courts
+
+# Set by async_server.py, whose Socket.IO server lives on scan_loop
+async_socketio = None
+
+def set_async_socketio(server):
+    global async_socketio
+    async_socketio = server
+
+# The frontend connects to /find-courts; sockets on either namespace can follow scans
+SOCKET_NAMESPACES = ['/', '/find-courts']
+# sid -> (namespace, client id) for every connected socket
+sockets = {}
+sockets_lock = threading.Lock()
+
+def register_socket(sid, namespace, client):
+    with sockets_lock:
+        sockets[sid] = (namespace, client)
+
+def unregister_socket(sid):
+    with sockets_lock:
+        sockets.pop(sid, None)
+
+def get_scan_room(sid, client):
+    # Events only go to a connected socket of the same client; any other sid
+    # (another worker's socket, or one seen through a different proxy) just
+    # means the scan runs without socket events
+    if not sid:
+        return None
+    with sockets_lock:
+        if sockets.get(sid, (None, None))[1] == client:
+            return sid
+    print(f"Ignoring socket {sid}, it isn't connected here for client {client}")
+    return None
+
+def emit_to(room, event, data):
+    # Scan events only go to the socket that asked for the scan
+    with sockets_lock:
+        namespace = sockets[room][0] if room in sockets else None
+    if namespace is None:
+        return
+    if async_socketio is not None:
+        asyncio.run_coroutine_threadsafe(async_socketio.emit(event, data, to=room, namespace=namespace), scan_loop)
+    else:
+        socketio.emit(event, data, to=room, namespace=namespace)
+
+def on_connect(auth=None):
+    register_socket(request.sid, request.namespace, get_client_id(request.headers, request.remote_addr))
+
+def on_disconnect(reason=None):
+    unregister_socket(request.sid)
+
+for namespace in SOCKET_NAMESPACES:
+    socketio.on_event('connect', on_connect, namespace=namespace)
+    socketio.on_event('disconnect', on_disconnect, namespace=namespace)
+
+async def run_scan_async(top_left, bottom_right, room=None, on_progress=None):
+    cells, centers = get_grid_cells(top_left, bottom_right)
+    known = known_courts.query(top_left, bottom_right) if known_courts else []
+    for court in known:
+        emit_to(room, 'court', court)
+
+    if SKIP_KNOWN_COURTS and known:
+        unknown = ~known_courts.near(centers, KNOWN_COURT_RADIUS)
+        cells, centers = cells[unknown], centers[unknown]
+
+    coords = [tuple(center) for center in centers.tolist()]
+    cell_ids = [get_cell_id(row, col) for row, col in cells.tolist()]
+    print(f"{len(coords)} cells to scan, {len(known)} known courts")
+
+    last_report = 0
+
+    def report_progress(progress):
+        nonlocal last_report
+        if progress < 1 and time.monotonic() - last_report < PROGRESS_INTERVAL:
+            return
+        last_report = time.monotonic()
+        emit_to(room, 'progress', {'percent': round(progress * 100)})
+        if on_progress is not None:
+            on_progress(progress)
+
+    def report_detections(detections):
+        for lat, lon in detections:
+            emit_to(room, 'court', {'latitude': lat, 'longitude': lon})
+
+    loaded = await asyncio.to_thread(model_manager.current, MODEL_READY_TIMEOUT)
+    if SCAN_MODE == 'dense':
+        scan = scan_region_dense(coords, loaded, report_progress, report_detections)
+    elif SCAN_MODE == 'pyramid':
+        scan = scan_region_pyramid(coords, cells, cell_ids, loaded, report_progress, report_detections)
+    else:
+        scan = scan_region_async(coords, cell_ids, loaded, report_progress, report_detections)
+    tennis_courts = add_known_courts(await scan, known)
+    print(tennis_courts)
+    return tennis_courts
+
+def run_scan(top_left, bottom_right, room=None, on_progress=None):
+    future = asyncio.run_coroutine_threadsafe(run_scan_async(top_left, bottom_right, room, on_progress), scan_loop)
+    return future.result()
+
+def estimate_scan_bytes(cell_count):
+    queued_tiles = min(cell_count, QUEUE_SIZE + fetcher.max_in_flight)
+    decoded_tiles = min(cell_count, BATCH_SIZE)
+    estimate = queued_tiles * TILE_BYTES_ESTIMATE + decoded_tiles * TILE_SIZE ** 2 * 3 + cell_count * CELL_BYTES_ESTIMATE
+    if SCAN_MODE == 'dense':
+        estimate += cell_count * MODEL_INPUT_SIZE[0] * MODEL_INPUT_SIZE[1] * 3 + HEATMAP_ACTIVATION_BYTES
+    return estimate
+
+def run_admitted_scan(client, cell_count, top_left, bottom_right, room=None, on_progress=None):
+    with admission.running(client, cell_count):
+        return run_scan(top_left, bottom_right, room, on_progress)
+
+async def run_admitted_scan_async(client, cell_count, top_left, bottom_right, room=None, on_progress=None):
+    async with admission.running_async(client, cell_count):
+        return await run_scan_async(top_left, bottom_right, room, on_progress)
+
+# A dense mosaic costs about 67 KB per cell on top of the tile pipeline, so
+# dense mode defaults to caps that keep running mosaics around 400 MB
+admission = AdmissionController(
+    max_cells_per_job=int(os.getenv('MAX_CELLS_PER_SCAN', 2000 if SCAN_MODE == 'dense' else 5000)),
+    max_client_cells=int(os.getenv('MAX_CELLS_PER_CLIENT', 10000)),
+    max_running_cells=int(os.getenv('MAX_RUNNING_CELLS', 6000 if SCAN_MODE == 'dense' else 20000)),
+    max_queued_cells=int(os.getenv('MAX_QUEUED_CELLS', 50000)),
+)
+
+# X-Forwarded-For is only believed when the request comes from one of these
+# addresses or networks, e.g. TRUSTED_PROXIES=127.0.0.1,10.0.0.0/8
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(proxy.strip(), strict=False)
+    for proxy in os.getenv('TRUSTED_PROXIES', '').split(',') if proxy.strip()
+]
+
+scan_jobs = ScanJobs(
+    max_workers=int(os.getenv('SCAN_WORKERS', 4)),
+    ttl=int(os.getenv('SCAN_JOB_TTL', 3600)),
+    on_update=lambda room, job: emit_to(room, 'job', job),
+    loop=scan_loop,
+)
+
+def get_bounding_box(args):
+    try:
+        lat_top_left = float(args.get('lat_top_left'))
+        lon_top_left = float(args.get('lon_top_left'))
+        lat_bottom_right = float(args.get('lat_bottom_right'))
+        lon_bottom_right = float(args.get('lon_bottom_right'))
+    except (TypeError, ValueError):
+        return None
+    if not all(map(math.isfinite, (lat_top_left, lon_top_left, lat_bottom_right, lon_bottom_right))):
+        return None
+
+    return (lat_top_left, lon_top_left), (lat_bottom_right, lon_bottom_right)
+
+def is_trusted_proxy(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+def get_client_id(headers, remote_addr):
+    # Walks X-Forwarded-For back from our own proxy and stops at the first
+    # hop that isn't trusted, since anything before it is client-supplied
+    client = remote_addr
+    hops = [hop.strip() for hop in headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+    while hops and is_trusted_proxy(client):
+        client = hops.pop()
+    return client
+
+def admit_scan(bounding_box, sid, client, run=run_admitted_scan):
+    # Sizes the scan before anything is fetched and either reserves its cells
+    # or raises AdmissionError; the reservation is released when the job ends
+    cell_count = count_grid_cells(*bounding_box)
+    estimated_bytes = estimate_scan_bytes(cell_count)
+    admission.admit(client, cell_count, estimated_bytes)
+    job_id = scan_jobs.submit(run, client, cell_count, *bounding_box, sid, room=sid)
+    return job_id, {"cells": cell_count, "estimated_memory_mb": round(estimated_bytes / 1024 ** 2, 1)}
+
+def find_scan_results(bounding_box, loaded):
+    # Courts already found in the box by earlier scans, straight from the store
+    cells = prediction_cache.find(*bounding_box, get_prediction_version(loaded), min_score=REFINE_LOW)
+    detections = []
+    for cell_id, center, score, nodes in cells:
+        detections += get_node_detections(center, score, nodes or {})
+    return {"tennis_courts": merge_courts(detections, proximity=200), "cells": len(cells)}
+
+def get_stats():
+    return {
+        "tile_cache": tile_cache.stats(),
+        "prediction_cache": prediction_cache.stats(),
+        "scan_jobs": scan_jobs.stats(),
+        "model": model_manager.status(),
+        "admission": admission.stats(),
+        "cascade": cascade.stats() if cascade else None,
+        "pyramid": {**pyramid_counters, "cascade": coarse_cascade.stats() if coarse_cascade else None},
+        "known_courts": known_courts.stats() if known_courts else None,
+        "singleflight": {
+            **pending_cells.stats(),
+            "tiles": fetcher.stats(),
+        },
+    }
+
 @app.route('/')
 def index():
     return "API is running"
 
+@app.route('/known-courts', methods=['GET'])
+def get_known_courts():
+    bounding_box = get_bounding_box(request.args)
+    if bounding_box is None:
+        return jsonify({"error": "Please provide top-left and bottom-right coordinates"}), 400
+    return jsonify({"tennis_courts": known_courts.query(*bounding_box) if known_courts else []})
+
+@app.route('/scan-results', methods=['GET'])
+def get_scan_results():
+    bounding_box = get_bounding_box(request.args)
+    if bounding_box is None:
+        return jsonify({"error": "Please provide top-left and bottom-right coordinates"}), 400
+
+    loaded = model_manager.loaded
+    if loaded is None:
+        return jsonify({"error": "Model is not ready"}), 503
+    return jsonify(find_scan_results(bounding_box, loaded))
+
+@app.route('/stats')
+def stats():
+    return jsonify(get_stats())
+
+@app.route('/ready')
+def ready():
+    status = model_manager.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.route('/model/reload', methods=['POST'])
+def reload_model():
+    if not MODEL_ADMIN_TOKEN or request.headers.get('Authorization') != f"Bearer {MODEL_ADMIN_TOKEN}":
+        return jsonify({"error": "Not allowed"}), 403
+
+    version = (request.get_json(silent=True) or {}).get('version')
+    model_manager.load_in_background(version)
+    return jsonify({"reloading": version or "latest"}), 202
+
 @app.route('/find-courts', methods=['GET'])
 def find_courts():
-    lat_top_left = float(request.args.get('lat_top_left'))
-    lon_top_left = float(request.args.get('lon_top_left'))
-    lat_bottom_right = float(request.args.get('lat_bottom_right'))
-    lon_bottom_right = float(request.args.get('lon_bottom_right'))
-    
-    if not (lat_top_left and lon_top_left and lat_bottom_right and lon_bottom_right):
+    bounding_box = get_bounding_box(request.args)
+    if bounding_box is None:
         return jsonify({"error": "Please provide top-left and bottom-right coordinates"}), 400
 
+    client = get_client_id(request.headers, request.remote_addr)
+    sid = get_scan_room(request.args.get('sid'), client)
+
+    try:
+        job_id, estimate = admit_scan(bounding_box, sid, client)
+    except AdmissionError as e:
+        emit_to(sid, 'error', {'message': str(e)})
+        return jsonify({"error": str(e)}), e.status
+
     try:
-        coords = get_grid_coordinates((lat_top_left, lon_top_left), (lat_bottom_right, lon_bottom_right))
-        print(len(coords))
-        
-        socketio.emit('status', {'message': 'Fetching images'})
-        
-        images = asyncio.run(get_google_maps_images_async(coords))
-        
-        socketio.emit('status', {'message': 'Scanning region'})
-        
-        tennis_courts = []
-
-        for i, img in enumerate(images):
-            if img:
-                img_array = preprocess_image(img)
-                prediction = model.predict(img_array)
-                if is_tennis_court(prediction):
-                    new_court = {
-                        "latitude": coords[i][0],
-                        "longitude": coords[i][1]
-                    }
-                    tennis_courts = combine_close_courts(tennis_courts, new_court, proximity=200)
-                    
-                    quadrants = divide_image_into_quadrants(img)
-                    
-                    for j, quadrant in enumerate(quadrants):
-                        quadrant_array = preprocess_image(quadrant)
-                        quadrant_prediction = model.predict(quadrant_array)
-                        if is_tennis_court(quadrant_prediction):
-                            quadrant_coords = get_quadrant_coordinates(coords[i], j)
-                            quadrant_court = {
-                                "latitude": quadrant_coords[0],
-                                "longitude": quadrant_coords[1]
-                            }
-                            tennis_courts = combine_close_courts(tennis_courts, quadrant_court, proximity=200)
-
-        socketio.emit('complete', {'courtCount': len(tennis_courts)})
-        print(tennis_courts)
+        emit_to(sid, 'status', {'message': f"Scanning {estimate['cells']} cells"})
+        tennis_courts = scan_jobs.wait(job_id)
+
+        emit_to(sid, 'complete', {'courtCount': len(tennis_courts)})
         return jsonify({"tennis_courts": tennis_courts})
 
     except Exception as e:
         print(f"An error occurred: {e}")
-        socketio.emit('error', {'message': 'Something went wrong during court detection.'})
+        emit_to(sid, 'error', {'message': 'Something went wrong during court detection.'})
+        return jsonify({"error": "An error occurred during processing"}), 500
+
+@app.route('/scans', methods=['POST'])
+def submit_scan():
+    args = request.get_json(silent=True) or request.args
+    bounding_box = get_bounding_box(args)
+    if bounding_box is None:
+        return jsonify({"error": "Please provide top-left and bottom-right coordinates"}), 400
+
+    client = get_client_id(request.headers, request.remote_addr)
+    sid = get_scan_room(args.get('sid'), client)
+
+    try:
+        job_id, estimate = admit_scan(bounding_box, sid, client)
+    except AdmissionError as e:
+        return jsonify({"error": str(e)}), e.status
+    return jsonify({"job_id": job_id, **estimate, "queue": admission.stats()}), 202
+
+@app.route('/scans/<job_id>', methods=['GET'])
+def get_scan(job_id):
+    job = scan_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(scan_jobs.describe(job))
+
+@app.route('/scans/<job_id>/result', methods=['GET'])
+def get_scan_result(job_id):
+    job = scan_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job["status"] == "failed":
         return jsonify({"error": "An error occurred during processing"}), 500
+    if job["status"] != "done":
+        return jsonify(scan_jobs.describe(job)), 202
+    return jsonify({"tennis_courts": job["result"]})
 
 if __name__ == '__main__':
     socketio.run(app, host='0.0.0.0', port=5000)
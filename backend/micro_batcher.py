@@ -0,0 +1,94 @@
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+import numpy as np
+
+def run_flusher(ref, requests):
+    # Only holds the batcher while flushing, so a swapped-out model can still be freed
+    while True:
+        try:
+            first = requests.get(timeout=1)
+        except queue.Empty:
+            if ref() is None:
+                return
+            continue
+
+        batcher = ref()
+        if batcher is not None:
+            batcher.flush(first)
+        del batcher
+
+class MicroBatcher:
+    # Wraps a backend so predict calls from every in-flight scan share model
+    # batches: rows are gathered until max_batch_size or max_wait has passed
+    # since the first one arrived, then each caller gets its own scores back
+    def __init__(self, backend, max_batch_size=128, max_wait=0.005, flushers=1):
+        self.backend = backend
+        self.name = backend.name
+        self.model_path = backend.model_path
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.counters = {"batches": 0, "requests": 0, "rows": 0}
+
+        for _ in range(flushers):
+            threading.Thread(target=run_flusher, args=(weakref.ref(self), self.requests), daemon=True).start()
+
+    def predict(self, batch):
+        if not len(batch):
+            return self.backend.predict(batch)
+        future = Future()
+        self.requests.put((batch, future))
+        return future.result()
+
+    def flush(self, first):
+        pending = [first]
+        rows = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while rows < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            pending.append(request)
+            rows += len(request[0])
+
+        try:
+            batch = np.concatenate([request[0] for request in pending])
+            scores = np.concatenate([
+                self.backend.predict(batch[start:start + self.max_batch_size])
+                for start in range(0, len(batch), self.max_batch_size)
+            ])
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+
+        with self.lock:
+            self.counters["batches"] += 1
+            self.counters["requests"] += len(pending)
+            self.counters["rows"] += rows
+
+        offset = 0
+        for request, future in pending:
+            future.set_result(scores[offset:offset + len(request)])
+            offset += len(request)
+
+    def close(self):
+        if hasattr(self.backend, 'close'):
+            self.backend.close()
+
+    def stats(self):
+        with self.lock:
+            return {
+                **self.counters,
+                "average_batch_size": self.counters["rows"] / self.counters["batches"] if self.counters["batches"] else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+            }
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+import numpy as np
+
+from inference import load_backend, WorkerPoolBackend
+from micro_batcher import MicroBatcher
+
+LoadedModel = namedtuple('LoadedModel', ['version', 'model_hash', 'backend'])
+
+def get_file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ModelManager:
+    # Artifacts live in the store as <version>/<artifact> next to <version>/<artifact>.sha256,
+    # and a top-level LATEST object names the version to serve when none is pinned
+    def __init__(self, backend_name, artifact, cache_dir, bucket=None, endpoint_url=None,
+                 local_path=None, num_threads=None, workers=0, warmup_batch_size=32,
+                 micro_batch_size=0, micro_batch_wait=0.005, on_swap=None):
+        self.backend_name = backend_name
+        self.artifact = artifact
+        self.cache_dir = cache_dir
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.local_path = local_path
+        self.num_threads = num_threads
+        self.workers = workers
+        self.warmup_batch_size = warmup_batch_size
+        self.micro_batch_size = micro_batch_size
+        self.micro_batch_wait = micro_batch_wait
+        self.on_swap = on_swap
+        self.loaded = None
+        self.ready = threading.Event()
+        self.reload_lock = threading.Lock()
+        self.error = None
+        self.s3 = None
+
+    def get_store(self):
+        if self.s3 is None:
+            import boto3
+            self.s3 = boto3.client('s3', endpoint_url=self.endpoint_url)
+        return self.s3
+
+    def get_latest_version(self):
+        response = self.get_store().get_object(Bucket=self.bucket, Key='LATEST')
+        return response['Body'].read().decode().strip()
+
+    def fetch(self, version):
+        local_path = os.path.join(self.cache_dir, version, self.artifact)
+        checksum_path = f"{local_path}.sha256"
+
+        if os.path.exists(local_path) and os.path.exists(checksum_path):
+            with open(checksum_path) as f:
+                expected = f.read().strip()
+            if get_file_sha256(local_path) == expected:
+                print(f"Using cached model {version} from {local_path}")
+                return local_path
+            print(f"Cached model {version} failed its checksum, downloading again")
+
+        key = f"{version}/{self.artifact}"
+        store = self.get_store()
+        expected = store.get_object(Bucket=self.bucket, Key=f"{key}.sha256")['Body'].read().decode().split()[0]
+
+        print(f"Downloading model {version} from {self.bucket}/{key}...")
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        tmp_path = f"{local_path}.{threading.get_ident()}.tmp"
+        store.download_file(self.bucket, key, tmp_path)
+
+        actual = get_file_sha256(tmp_path)
+        if actual != expected:
+            os.remove(tmp_path)
+            raise ValueError(f"Checksum mismatch for model {version}: expected {expected}, got {actual}")
+
+        os.replace(tmp_path, local_path)
+        with open(checksum_path, 'w') as f:
+            f.write(expected)
+        print("Model downloaded successfully")
+        return local_path
+
+    def load(self, version=None):
+        with self.reload_lock:
+            if self.bucket:
+                version = version or self.get_latest_version()
+                path = self.fetch(version)
+            else:
+                path = self.local_path
+                version = version or 'local'
+
+            model_hash = get_file_sha256(path)[:16]
+            if self.loaded is not None and self.loaded.model_hash == model_hash:
+                print(f"Model {version} is already being served")
+                return self.loaded
+
+            backend = load_backend(self.backend_name, path, self.num_threads, self.workers)
+            if self.micro_batch_size:
+                backend = MicroBatcher(backend, self.micro_batch_size, self.micro_batch_wait, max(1, self.workers))
+
+            start = time.perf_counter()
+            backend.predict(np.zeros((self.warmup_batch_size, 150, 150, 3), dtype=np.uint8))
+            print(f"Warmed up model {version} in {time.perf_counter() - start:.1f}s")
+
+            # Scans hold on to the LoadedModel they started with, so swapping
+            # the reference never pulls a model out from under them
+            self.loaded = LoadedModel(version, model_hash, backend)
+            self.error = None
+            self.ready.set()
+
+        if self.on_swap is not None:
+            self.on_swap(self.loaded)
+        return self.loaded
+
+    def load_in_background(self, version=None):
+        def run():
+            try:
+                self.load(version)
+            except Exception as e:
+                self.error = str(e)
+                print(f"Failed to load model {version or 'latest'}: {e}")
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def watch(self, interval):
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self.loaded is None or self.get_latest_version() != self.loaded.version:
+                        self.load()
+                except Exception as e:
+                    print(f"Model watch failed: {e}")
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def current(self, timeout=None):
+        if not self.ready.wait(timeout):
+            raise RuntimeError("Model is not ready")
+        return self.loaded
+
+    def status(self):
+        backend = self.loaded.backend if self.loaded else None
+        if isinstance(backend, MicroBatcher):
+            backend = backend.backend
+        return {
+            "ready": self.ready.is_set(),
+            "version": self.loaded.version if self.loaded else None,
+            "model_hash": self.loaded.model_hash if self.loaded else None,
+            "backend": self.backend_name,
+            "workers": self.workers,
+            "pool": backend.stats() if isinstance(backend, WorkerPoolBackend) else None,
+            "error": self.error,
+            "micro_batching": self.loaded.backend.stats() if self.loaded and isinstance(self.loaded.backend, MicroBatcher) else None,
+        }
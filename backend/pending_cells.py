@@ -0,0 +1,44 @@
+import asyncio
+
+class PendingCells:
+    # (prediction version, cell id) -> future for cells some scan is fetching and
+    # scoring right now, so overlapping scans await them instead of redoing them.
+    # Only touched on the event loop the scans run on.
+    def __init__(self):
+        self.futures = {}
+        self.joined = 0
+
+    def claim(self, version, cell_ids):
+        # cell_ids maps positions to cell ids; returns the futures this scan now
+        # owns and the ones another scan owns, both by position
+        loop = asyncio.get_running_loop()
+        owned, joined = {}, {}
+        for i, cell_id in cell_ids.items():
+            future = self.futures.get((version, cell_id))
+            if future is not None:
+                joined[i] = future
+            else:
+                owned[i] = self.futures[(version, cell_id)] = loop.create_future()
+        self.joined += len(joined)
+        return owned, joined
+
+    def resolve(self, owned, results):
+        for i, result in results.items():
+            if i in owned and not owned[i].done():
+                owned[i].set_result(result)
+
+    def release(self, version, cell_ids, owned):
+        # Cells that failed resolve to None, so scans waiting on them don't hang
+        for i, future in owned.items():
+            if not future.done():
+                future.set_result(None)
+            if self.futures.get((version, cell_ids[i])) is future:
+                del self.futures[(version, cell_ids[i])]
+
+    async def join(self, joined):
+        # Results of the cells other scans owned, without the ones that failed
+        results = dict(zip(joined, await asyncio.gather(*joined.values())))
+        return {i: result for i, result in results.items() if result is not None}
+
+    def stats(self):
+        return {"cells_in_flight": len(self.futures), "cells_joined": self.joined}
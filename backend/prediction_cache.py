@@ -0,0 +1,159 @@
+import json
+import sqlite3
+import threading
+import time
+
+class PredictionCache:
+    # Durable per-cell scan results: every cell's score, refinement nodes, model
+    # version and scan time, with the cell's bounds in an R-tree for box queries.
+    # Results of every model version are kept, so a rollback finds its old
+    # scans again; rows older than max_age and the oldest rows beyond max_rows
+    # are pruned at most every prune_interval seconds.
+    def __init__(self, db_path, max_age=None, max_rows=None, prune_interval=3600):
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.max_age = max_age
+        self.max_rows = max_rows
+        self.prune_interval = prune_interval
+        self.last_prune = 0
+        self.counters = {"hits": 0, "misses": 0, "stale": 0, "pruned": 0}
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            " model_version TEXT NOT NULL,"
+            " cell_id TEXT NOT NULL,"
+            " score REAL NOT NULL,"
+            " quadrant_scores TEXT,"
+            " PRIMARY KEY (model_version, cell_id))"
+        )
+        # Caches written before results were timestamped count as stale
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(predictions)")}
+        if "scanned_at" not in columns:
+            self.db.execute("ALTER TABLE predictions ADD COLUMN scanned_at REAL")
+        self.db.execute("CREATE INDEX IF NOT EXISTS predictions_scanned_at ON predictions (scanned_at)")
+        self.db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS prediction_bounds USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+        )
+        self.db.commit()
+        self.model_version = None
+
+    def set_model_version(self, model_version):
+        with self.lock:
+            if model_version == self.model_version:
+                return
+            self.model_version = model_version
+        print(f"Prediction cache using model version {model_version}")
+        self.prune()
+
+    def delete_rows(self, where, params=()):
+        # Caller holds the lock
+        self.db.execute(f"DELETE FROM prediction_bounds WHERE id IN (SELECT rowid FROM predictions WHERE {where})", params)
+        return self.db.execute(f"DELETE FROM predictions WHERE {where}", params).rowcount
+
+    def prune(self):
+        with self.lock:
+            self.last_prune = time.time()
+            pruned = 0
+            if self.max_age is not None:
+                pruned += self.delete_rows("scanned_at IS NULL OR scanned_at < ?", (self.last_prune - self.max_age,))
+            if self.max_rows:
+                pruned += self.delete_rows(
+                    "rowid IN (SELECT rowid FROM predictions ORDER BY scanned_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_rows,),
+                )
+            self.db.commit()
+            self.counters["pruned"] += pruned
+        if pruned:
+            print(f"Pruned {pruned} old scan results")
+
+    def is_fresh(self, scanned_at, now):
+        return self.max_age is None or (scanned_at is not None and now - scanned_at <= self.max_age)
+
+    def get_many(self, cell_ids, model_version):
+        # Cells that are missing or older than max_age are left out, so the
+        # caller fetches and scores them again
+        results = {}
+        stale = 0
+        now = time.time()
+        with self.lock:
+            for start in range(0, len(cell_ids), 500):
+                chunk = cell_ids[start:start + 500]
+                rows = self.db.execute(
+                    f"SELECT cell_id, score, quadrant_scores, scanned_at FROM predictions"
+                    f" WHERE model_version = ? AND cell_id IN ({','.join('?' * len(chunk))})",
+                    (model_version, *chunk),
+                )
+                for cell_id, score, quadrant_scores, scanned_at in rows:
+                    if not self.is_fresh(scanned_at, now):
+                        stale += 1
+                        continue
+                    results[cell_id] = (score, json.loads(quadrant_scores) if quadrant_scores else None)
+
+            self.counters["hits"] += len(results)
+            self.counters["stale"] += stale
+            self.counters["misses"] += len(cell_ids) - len(results) - stale
+        return results
+
+    def put_many(self, predictions, model_version, bounds):
+        # bounds maps each cell id to its (min_lat, max_lat, min_lon, max_lon)
+        now = time.time()
+        cell_ids = list(predictions)
+        with self.lock:
+            self.db.executemany(
+                "INSERT INTO predictions (model_version, cell_id, score, quadrant_scores, scanned_at)"
+                " VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (model_version, cell_id) DO UPDATE SET"
+                " score = excluded.score, quadrant_scores = excluded.quadrant_scores, scanned_at = excluded.scanned_at",
+                [
+                    (model_version, cell_id, score, json.dumps(quadrant_scores) if quadrant_scores else None, now)
+                    for cell_id, (score, quadrant_scores) in predictions.items()
+                ],
+            )
+            for start in range(0, len(cell_ids), 500):
+                chunk = cell_ids[start:start + 500]
+                rows = self.db.execute(
+                    f"SELECT rowid, cell_id FROM predictions"
+                    f" WHERE model_version = ? AND cell_id IN ({','.join('?' * len(chunk))})",
+                    (model_version, *chunk),
+                ).fetchall()
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO prediction_bounds VALUES (?, ?, ?, ?, ?)",
+                    [(rowid, *bounds[cell_id]) for rowid, cell_id in rows],
+                )
+            self.db.commit()
+            due = time.time() - self.last_prune > self.prune_interval
+        if due:
+            self.prune()
+
+    def find(self, top_left, bottom_right, model_version, min_score=0.0):
+        # Fresh results for the cells overlapping the box, as
+        # (cell_id, center, score, quadrant_scores)
+        (lat_top, lon_left), (lat_bottom, lon_right) = top_left, bottom_right
+        now = time.time()
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT p.cell_id, b.min_lat, b.max_lat, b.min_lon, b.max_lon, p.score, p.quadrant_scores, p.scanned_at"
+                " FROM prediction_bounds b JOIN predictions p ON p.rowid = b.id"
+                " WHERE b.max_lat >= ? AND b.min_lat <= ? AND b.max_lon >= ? AND b.min_lon <= ?"
+                " AND p.model_version = ? AND p.score >= ?",
+                (lat_bottom, lat_top, lon_left, lon_right, model_version, min_score),
+            ).fetchall()
+
+        return [
+            (cell_id, ((min_lat + max_lat) / 2, (min_lon + max_lon) / 2), score,
+             json.loads(quadrant_scores) if quadrant_scores else None)
+            for cell_id, min_lat, max_lat, min_lon, max_lon, score, quadrant_scores, scanned_at in rows
+            if self.is_fresh(scanned_at, now)
+        ]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["misses"] + self.counters["stale"]
+            cells = self.db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+            return {
+                **self.counters,
+                "hit_rate": self.counters["hits"] / lookups if lookups else 0.0,
+                "cells": cells,
+                "max_age": self.max_age,
+                "max_rows": self.max_rows,
+                "model_version": self.model_version,
+            }
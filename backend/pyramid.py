@@ -0,0 +1,69 @@
+import math
+import numpy as np
+
+EARTH_RADIUS = 6371e3
+# Web Mercator ground size of one zoom-0 pixel at the equator
+EQUATOR_METERS_PER_PIXEL = 2 * math.pi * 6378137 / 256
+# Room left in every coarse tile for the scale changing across it
+TILE_MARGIN = 0.999
+
+def get_meters_per_pixel(lats, zoom):
+    return EQUATOR_METERS_PER_PIXEL * np.cos(np.radians(lats)) / 2 ** zoom
+
+def get_cells_per_tile(lats, zoom, tile_size, box_size=140):
+    # Cells that fit across a tile at these latitudes; tiles hold fewer towards the poles
+    meters = tile_size * get_meters_per_pixel(lats, zoom) * TILE_MARGIN
+    return np.maximum(1, np.floor(meters / box_size)).astype(np.int64)
+
+def project(lats, lons, zoom):
+    world = 256 * 2 ** zoom
+    xs = (np.asarray(lons) + 180) / 360 * world
+    ys = (1 - np.log(np.tan(np.pi / 4 + np.radians(lats) / 2)) / np.pi) / 2 * world
+    return xs, ys
+
+def unproject(xs, ys, zoom):
+    world = 256 * 2 ** zoom
+    lons = np.asarray(xs) / world * 360 - 180
+    lats = np.degrees(2 * np.arctan(np.exp(np.pi * (1 - 2 * np.asarray(ys) / world))) - np.pi / 2)
+    return lats, lons
+
+def get_cell_extents(centers, zoom, box_size=140):
+    # Left, top, right and bottom world pixels of every cell's box
+    xs, ys = project(centers[:, 0], centers[:, 1], zoom)
+    half = box_size / 2 / get_meters_per_pixel(centers[:, 0], zoom)
+    return xs - half, ys - half, xs + half, ys + half
+
+def get_coarse_tiles(cells, centers, zoom, tile_size, box_size=140):
+    # Rows are grouped into bands as tall as a tile at their latitude, and every
+    # band is cut into runs of cells whose centres are less than a tile minus one
+    # cell apart at the band's latitude, so every cell's box fits the tile centred
+    # on its run. Both follow the global grid, so every request sees the same tiles.
+    d_lat = math.degrees(box_size / EARTH_RADIUS)
+    per_tile = get_cells_per_tile(centers[:, 0], zoom, tile_size, box_size)
+    bands = np.floor_divide(cells[:, 0], per_tile)
+    band_lats = (bands * per_tile + per_tile / 2) * d_lat
+    meters = np.radians(centers[:, 1] + 180) * EARTH_RADIUS * np.cos(np.radians(band_lats))
+    runs = np.floor_divide(meters, np.maximum(per_tile - 1, 1) * box_size).astype(np.int64)
+    keys, block_index = np.unique(np.stack([per_tile, bands, runs], axis=1), axis=0, return_inverse=True)
+    block_index = block_index.reshape(-1)
+
+    left, top, right, bottom = get_cell_extents(centers, zoom, box_size)
+    lefts, tops = np.full(len(keys), np.inf), np.full(len(keys), np.inf)
+    rights, bottoms = np.full(len(keys), -np.inf), np.full(len(keys), -np.inf)
+    np.minimum.at(lefts, block_index, left)
+    np.minimum.at(tops, block_index, top)
+    np.maximum.at(rights, block_index, right)
+    np.maximum.at(bottoms, block_index, bottom)
+
+    lats, lons = unproject((lefts + rights) / 2, (tops + bottoms) / 2, zoom)
+    return np.stack([lats, lons], axis=1), block_index
+
+def get_cell_boxes(cell_centers, tile_center, zoom, tile_size, box_size=140):
+    # Where each cell falls in a coarse tile of tile_size pixels
+    left, top, right, bottom = get_cell_extents(cell_centers, zoom, box_size)
+    x, y = project(tile_center[0], tile_center[1], zoom)
+    x, y = x - tile_size / 2, y - tile_size / 2
+    return [
+        (round(l - x), round(t - y), round(r - x), round(b - y))
+        for l, t, r, b in zip(left.tolist(), top.tolist(), right.tolist(), bottom.tolist())
+    ]
@@ -0,0 +1,53 @@
+import math
+import threading
+
+# Nodes are named by their path from the tile: '' is the whole tile, '2' its
+# bottom-left quadrant, '21' the top-right quadrant of that, and so on
+
+def get_quadrant_boxes(box):
+    left, top, right, bottom = box
+    mid_x = (left + right) // 2
+    mid_y = (top + bottom) // 2
+
+    return [
+        (left, top, mid_x, mid_y),
+        (mid_x, top, right, mid_y),
+        (left, mid_y, mid_x, bottom),
+        (mid_x, mid_y, right, bottom),
+    ]
+
+def get_node_coordinates(center_coords, path, box_size=140):
+    lat, lon = center_coords
+    north = east = 0.0
+    size = box_size
+    for quadrant in map(int, path):
+        size /= 2
+        north += size / 2 if quadrant < 2 else -size / 2
+        east += size / 2 if quadrant % 2 else -size / 2
+
+    return (lat + north / 111111, lon + east / (111111 * math.cos(math.radians(lat))))  # 111111 meters per degree latitude
+
+def get_node_detections(center_coords, score, nodes, threshold=0.5, path=''):
+    # A refined node reports whatever its children found; only when none of
+    # them is a court does it fall back to its own score
+    detections = []
+    for quadrant in range(4):
+        child = path + str(quadrant)
+        if child in nodes:
+            detections += get_node_detections(center_coords, nodes[child], nodes, threshold, child)
+
+    if detections:
+        return detections
+    return [get_node_coordinates(center_coords, path)] if score >= threshold else []
+
+class RefinementBudget:
+    # Shared by every batch of one scan, which may be scored on several threads
+    def __init__(self, predictions):
+        self.remaining = predictions
+        self.lock = threading.Lock()
+
+    def take(self, predictions):
+        with self.lock:
+            granted = min(predictions, self.remaining)
+            self.remaining -= granted
+            return granted
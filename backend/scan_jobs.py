@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+class ScanJobs:
+    def __init__(self, max_workers=4, ttl=3600, on_update=None, loop=None):
+        # Plain functions run on the worker threads, coroutine functions on loop
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scan')
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.on_update = on_update
+        self.loop = loop
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, fn, *args, room=None):
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "room": room,
+            "status": "queued",
+            "progress": 0.0,
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "finished_at": None,
+        }
+        with self.lock:
+            self.prune()
+            self.jobs[job_id] = job
+        self.notify(job)
+
+        if asyncio.iscoroutinefunction(fn):
+            job["future"] = asyncio.run_coroutine_threadsafe(self.run_async(job, fn, args), self.loop)
+        else:
+            job["future"] = self.executor.submit(self.run, job, fn, args)
+        return job_id
+
+    def run(self, job, fn, args):
+        self.update(job, status="running")
+        try:
+            result = fn(*args, lambda progress: self.update(job, progress=progress))
+        except Exception as e:
+            traceback.print_exc()
+            self.update(job, status="failed", error=str(e), finished_at=time.time())
+            raise
+        self.update(job, status="done", progress=1.0, result=result, finished_at=time.time())
+        return result
+
+    async def run_async(self, job, fn, args):
+        self.update(job, status="running")
+        try:
+            result = await fn(*args, lambda progress: self.update(job, progress=progress))
+        except Exception as e:
+            traceback.print_exc()
+            self.update(job, status="failed", error=str(e), finished_at=time.time())
+            raise
+        self.update(job, status="done", progress=1.0, result=result, finished_at=time.time())
+        return result
+
+    def update(self, job, **changes):
+        with self.lock:
+            job.update(changes)
+        self.notify(job)
+
+    def notify(self, job):
+        if self.on_update is not None:
+            self.on_update(job["room"], self.describe(job))
+
+    def describe(self, job):
+        return {key: job[key] for key in ("job_id", "status", "progress", "error", "created_at", "finished_at")}
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def wait(self, job_id):
+        return self.get(job_id)["future"].result()
+
+    async def wait_async(self, job_id):
+        # Shielded so a client that hangs up doesn't cancel the scan itself
+        return await asyncio.shield(asyncio.wrap_future(self.get(job_id)["future"]))
+
+    def prune(self):
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self.jobs.items() if job["finished_at"] and job["finished_at"] < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def stats(self):
+        with self.lock:
+            statuses = [job["status"] for job in self.jobs.values()]
+        return {
+            "workers": self.max_workers,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+        }
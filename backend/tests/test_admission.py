@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+import pytest
+
+from admission import AdmissionController, AdmissionError
+
+def test_rejects_oversized_scans():
+    admission = AdmissionController(max_cells_per_job=100)
+    with pytest.raises(AdmissionError) as error:
+        admission.admit('a', 101, 0)
+    assert error.value.status == 413
+
+def test_enforces_the_per_client_quota():
+    admission = AdmissionController(max_cells_per_job=100, max_client_cells=150)
+    admission.admit('a', 100, 0)
+    with pytest.raises(AdmissionError) as error:
+        admission.admit('a', 100, 0)
+    assert error.value.status == 429
+    admission.admit('b', 100, 0)  # other clients are unaffected
+
+def test_sheds_load_when_the_queue_is_full():
+    admission = AdmissionController(max_cells_per_job=100, max_client_cells=1000, max_queued_cells=150)
+    admission.admit('a', 100, 0)
+    with pytest.raises(AdmissionError) as error:
+        admission.admit('b', 100, 0)
+    assert error.value.status == 503
+    assert admission.stats()['rejected'] == 1
+
+def test_finished_scans_release_their_cells():
+    admission = AdmissionController(max_cells_per_job=100, max_client_cells=100)
+    admission.admit('a', 100, 0)
+    with admission.running('a', 100):
+        assert admission.stats()['running_cells'] == 100
+    admission.admit('a', 100, 0)
+
+    stats = admission.stats()
+    assert stats['running_cells'] == 0
+    assert stats['queued_cells'] == 100
+
+def test_failed_scans_release_their_cells():
+    admission = AdmissionController(max_cells_per_job=100, max_client_cells=100)
+    admission.admit('a', 100, 0)
+    with pytest.raises(RuntimeError):
+        with admission.running('a', 100):
+            raise RuntimeError("scan failed")
+    assert admission.stats()['clients'] == 0
+
+def test_running_waits_for_the_global_budget():
+    admission = AdmissionController(max_cells_per_job=8, max_running_cells=10)
+    order = []
+
+    def scan(client):
+        with admission.running(client, 8):
+            order.append(('start', client))
+            time.sleep(0.1)
+            order.append(('end', client))
+
+    admission.admit('a', 8, 0)
+    admission.admit('b', 8, 0)
+    threads = [threading.Thread(target=scan, args=(client,)) for client in 'ab']
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [event for event, _ in order] == ['start', 'end', 'start', 'end']
+
+def test_async_scans_wait_on_the_loop():
+    admission = AdmissionController(max_cells_per_job=8, max_running_cells=10)
+    order = []
+
+    async def scan(client):
+        async with admission.running_async(client, 8):
+            order.append(('start', client))
+            await asyncio.sleep(0.05)
+            order.append(('end', client))
+
+    async def main():
+        for client in 'abc':
+            admission.admit(client, 8, 0)
+        await asyncio.gather(*(scan(client) for client in 'abc'))
+
+    asyncio.run(main())
+    assert [event for event, _ in order] == ['start', 'end'] * 3
+    assert admission.stats()['running_cells'] == 0
+
+def test_thread_and_async_scans_share_the_budget():
+    admission = AdmissionController(max_cells_per_job=8, max_running_cells=10)
+    order = []
+    started = threading.Event()
+
+    def thread_scan():
+        with admission.running('t', 8):
+            started.set()
+            order.append('thread')
+            time.sleep(0.1)
+
+    async def main():
+        admission.admit('t', 8, 0)
+        admission.admit('a', 8, 0)
+        thread = threading.Thread(target=thread_scan)
+        thread.start()
+        started.wait()
+        async with admission.running_async('a', 8):
+            order.append('async')
+        thread.join()
+
+    asyncio.run(main())
+    assert order == ['thread', 'async']
@@ -0,0 +1,109 @@
+import hashlib
+import os
+import time
+import boto3
+import numpy as np
+import pytest
+from moto import mock_aws
+
+import model_manager
+from model_manager import ModelManager
+
+class FakeBackend:
+    # Stands in for a real inference backend so the tests don't need TensorFlow
+    def __init__(self, model_path):
+        self.model_path = model_path
+        with open(model_path, 'rb') as f:
+            self.content = f.read()
+
+    def predict(self, batch):
+        return np.zeros(len(batch), dtype=np.float32)
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(model_manager, 'load_backend', lambda name, path, *args: FakeBackend(path))
+    for name, value in [('AWS_ACCESS_KEY_ID', 'testing'), ('AWS_SECRET_ACCESS_KEY', 'testing'),
+                        ('AWS_DEFAULT_REGION', 'us-east-1')]:
+        monkeypatch.setenv(name, value)
+    with mock_aws():
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket='models')
+        yield s3
+
+def publish(s3, version, content, checksum=None, latest=True):
+    s3.put_object(Bucket='models', Key=f"{version}/model.keras", Body=content)
+    s3.put_object(Bucket='models', Key=f"{version}/model.keras.sha256",
+                  Body=f"{checksum or hashlib.sha256(content).hexdigest()}  model.keras\n".encode())
+    if latest:
+        s3.put_object(Bucket='models', Key='LATEST', Body=f"{version}\n".encode())
+
+def make_manager(tmp_path, **kwargs):
+    return ModelManager('keras', 'model.keras', str(tmp_path / 'models'), bucket='models', warmup_batch_size=1, **kwargs)
+
+def test_loads_the_latest_version(store, tmp_path):
+    publish(store, 'v1', b'weights one')
+    loaded = make_manager(tmp_path).load()
+
+    assert loaded.version == 'v1'
+    assert loaded.backend.content == b'weights one'
+    assert loaded.backend.model_path == str(tmp_path / 'models' / 'v1' / 'model.keras')
+
+def test_uses_the_cached_artifact(store, tmp_path):
+    publish(store, 'v1', b'weights one')
+    make_manager(tmp_path).load()
+    store.delete_object(Bucket='models', Key='v1/model.keras')
+
+    assert make_manager(tmp_path).load().backend.content == b'weights one'
+
+def test_downloads_again_when_the_cache_is_corrupt(store, tmp_path):
+    publish(store, 'v1', b'weights one')
+    path = make_manager(tmp_path).load().backend.model_path
+    with open(path, 'wb') as f:
+        f.write(b'truncated')
+
+    assert make_manager(tmp_path).load().backend.content == b'weights one'
+
+def test_rejects_a_checksum_mismatch(store, tmp_path):
+    publish(store, 'v1', b'weights one', checksum='0' * 64)
+
+    with pytest.raises(ValueError, match='Checksum mismatch'):
+        make_manager(tmp_path).load()
+    assert not os.listdir(tmp_path / 'models' / 'v1')
+
+def test_hot_swaps_to_a_new_version(store, tmp_path):
+    swaps = []
+    manager = make_manager(tmp_path, on_swap=swaps.append)
+    publish(store, 'v1', b'weights one')
+    first = manager.load()
+    publish(store, 'v2', b'weights two')
+    second = manager.load()
+
+    assert manager.current(timeout=0) is second
+    assert second.version == 'v2' and second.backend.content == b'weights two'
+    assert first.backend.content == b'weights one'  # scans holding v1 keep it
+    assert swaps == [first, second]
+
+def test_keeps_serving_an_identical_artifact(store, tmp_path):
+    manager = make_manager(tmp_path)
+    publish(store, 'v1', b'weights one')
+    first = manager.load()
+    publish(store, 'v1-rebuilt', b'weights one')
+
+    assert manager.load() is first
+
+def test_pinned_version_overrides_latest(store, tmp_path):
+    publish(store, 'v1', b'weights one', latest=False)
+    publish(store, 'v2', b'weights two')
+
+    assert make_manager(tmp_path).load('v1').backend.content == b'weights one'
+
+def test_failed_load_is_reported_in_status(store, tmp_path):
+    manager = make_manager(tmp_path)
+    manager.load_in_background('missing')
+    for _ in range(100):
+        if manager.error:
+            break
+        time.sleep(0.05)
+
+    assert manager.status()['ready'] is False
+    assert manager.status()['error']
@@ -0,0 +1,48 @@
+import asyncio
+
+from pending_cells import PendingCells
+
+def test_overlapping_claims_join_the_owner():
+    async def main():
+        pending = PendingCells()
+        owned, joined = pending.claim('v1', {0: '140/1/1', 1: '140/1/2'})
+        other_owned, other_joined = pending.claim('v1', {0: '140/1/2', 1: '140/1/3'})
+        assert list(owned) == [0, 1] and list(other_owned) == [1] and list(other_joined) == [0]
+
+        waiting = asyncio.create_task(pending.join(other_joined))
+        pending.resolve(owned, {1: 0.9})
+        assert await waiting == {0: 0.9}
+        assert pending.stats()["cells_joined"] == 1
+
+    asyncio.run(main())
+
+def test_cells_resolve_to_none_when_the_owner_fails():
+    async def main():
+        pending = PendingCells()
+        owned, _ = pending.claim('v1', {0: '140/1/1', 1: '140/1/2'})
+        _, joined = pending.claim('v1', {0: '140/1/1', 1: '140/1/2'})
+
+        waiting = asyncio.create_task(pending.join(joined))
+        pending.resolve(owned, {0: 0.1})
+        pending.release('v1', {0: '140/1/1', 1: '140/1/2'}, owned)
+        # The failed cell is dropped instead of hanging the joined scan
+        assert await asyncio.wait_for(waiting, 1) == {0: 0.1}
+
+    asyncio.run(main())
+
+def test_release_only_forgets_its_own_cells():
+    async def main():
+        pending = PendingCells()
+        owned, _ = pending.claim('v1', {0: '140/1/1'})
+        other_version, _ = pending.claim('v2', {0: '140/1/1'})
+        pending.release('v1', {0: '140/1/1'}, owned)
+        assert pending.stats()["cells_in_flight"] == 1
+
+        # A later scan claims the cell afresh once its owner is done
+        again, joined = pending.claim('v1', {0: '140/1/1'})
+        assert list(again) == [0] and not joined
+        pending.release('v1', {0: '140/1/1'}, again)
+        pending.release('v2', {0: '140/1/1'}, other_version)
+        assert pending.stats()["cells_in_flight"] == 0
+
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+import math
+import numpy as np
+import pytest
+
+from pyramid import get_coarse_tiles, get_cell_boxes, get_cells_per_tile, EARTH_RADIUS
+
+ZOOM = 16
+TILE_SIZE = 640
+
+def get_cells(top_left, bottom_right, box_size=140):
+    # The same global grid main.py scans: rows from the equator, columns from the antimeridian
+    d_lat = math.degrees(box_size / EARTH_RADIUS)
+    cells, centers = [], []
+    for row in range(math.floor(bottom_right[0] / d_lat), math.floor(top_left[0] / d_lat) + 1):
+        lat = (row + 0.5) * d_lat
+        d_lon = math.degrees(box_size / (EARTH_RADIUS * math.cos(math.radians(lat))))
+        for col in range(math.floor((top_left[1] + 180) / d_lon), math.floor((bottom_right[1] + 180) / d_lon) + 1):
+            cells.append((row, col))
+            centers.append((lat, (col + 0.5) * d_lon - 180))
+    return np.array(cells, dtype=np.int64), np.array(centers)
+
+@pytest.mark.parametrize("top_left, bottom_right", [
+    ((47.68, -122.42), (47.58, -122.26)),  # Seattle
+    ((60.24, 24.84), (60.14, 25.08)),  # Helsinki
+    ((-33.84, 151.14), (-33.92, 151.26)),  # Sydney
+])
+def test_every_cell_lies_inside_its_coarse_tile(top_left, bottom_right):
+    cells, centers = get_cells(top_left, bottom_right)
+    coarse_centers, block_index = get_coarse_tiles(cells, centers, ZOOM, TILE_SIZE)
+
+    for b, center in enumerate(coarse_centers):
+        members = np.flatnonzero(block_index == b)
+        for left, top, right, bottom in get_cell_boxes(centers[members], center, ZOOM, TILE_SIZE):
+            assert 0 <= left < right <= TILE_SIZE
+            assert 0 <= top < bottom <= TILE_SIZE
+
+def test_coarse_tiles_are_the_same_for_overlapping_requests():
+    cells, centers = get_cells((47.68, -122.42), (47.58, -122.26))
+    inner = (cells[:, 0] >= cells[:, 0].min() + 20) & (centers[:, 1] > -122.38)
+    coarse_centers, block_index = get_coarse_tiles(cells, centers, ZOOM, TILE_SIZE)
+    inner_centers, inner_index = get_coarse_tiles(cells[inner], centers[inner], ZOOM, TILE_SIZE)
+
+    # Tiles that the smaller request doesn't cut come out the same in both
+    for b in np.unique(block_index[inner]):
+        members = block_index == b
+        if inner[members].all():
+            np.testing.assert_allclose(inner_centers[inner_index[members[inner]][0]], coarse_centers[b])
+
+def test_tiles_hold_fewer_cells_towards_the_poles():
+    assert get_cells_per_tile(np.array([0.0, 39.0, 60.0]), ZOOM, TILE_SIZE).tolist() == [10, 8, 5]
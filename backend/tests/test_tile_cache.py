@@ -0,0 +1,61 @@
+import os
+
+from tile_cache import TileCache
+
+def test_round_trip_and_misses(tmp_path):
+    cache = TileCache(str(tmp_path))
+    assert cache.get('a' * 64) is None
+    cache.put('a' * 64, b'tile')
+    assert cache.get('a' * 64) == b'tile'
+    assert cache.stats()['misses'] == 1
+
+def test_evicts_least_recently_used_by_bytes(tmp_path):
+    cache = TileCache(str(tmp_path), max_bytes=250, memory_items=0)
+    a, b, c = 'aa' * 32, 'bb' * 32, 'cc' * 32
+    cache.put(a, b'x' * 100)
+    cache.put(b, b'y' * 100)
+    assert cache.get(a) == b'x' * 100  # a is now the most recently used
+    cache.put(c, b'z' * 100)
+
+    assert cache.get(b) is None
+    assert not os.path.exists(cache.get_path(b))
+    assert cache.get(a) == b'x' * 100
+    assert cache.get(c) == b'z' * 100
+    assert cache.total_bytes == 200
+    assert cache.stats()['evictions'] == 1
+
+def test_memory_tier_serves_recent_tiles(tmp_path):
+    cache = TileCache(str(tmp_path), memory_items=1)
+    cache.put('a' * 64, b'first')
+    cache.put('b' * 64, b'second')
+    cache.get('b' * 64)
+    cache.get('a' * 64)
+
+    stats = cache.stats()
+    assert stats['memory_hits'] == 1
+    assert stats['disk_hits'] == 1
+
+def test_index_survives_a_restart(tmp_path):
+    cache = TileCache(str(tmp_path))
+    cache.put('a' * 64, b'x' * 10)
+    cache.put('b' * 64, b'y' * 20)
+    leftover = cache.get_path('c' * 64) + '.123.tmp'
+    os.makedirs(os.path.dirname(leftover), exist_ok=True)
+    with open(leftover, 'wb') as f:
+        f.write(b'partial')
+
+    reopened = TileCache(str(tmp_path))
+    assert reopened.total_bytes == 30
+    assert reopened.get('b' * 64) == b'y' * 20
+    assert not os.path.exists(leftover)
+
+def test_restart_evicts_down_to_a_smaller_budget(tmp_path):
+    cache = TileCache(str(tmp_path))
+    for i, key in enumerate(['a' * 64, 'b' * 64, 'c' * 64]):
+        cache.put(key, b'x' * 100)
+        os.utime(cache.get_path(key), (i, i))
+
+    reopened = TileCache(str(tmp_path), max_bytes=200)
+    assert reopened.total_bytes == 200
+    assert reopened.get('a' * 64) is None
+    assert reopened.get('c' * 64) == b'x' * 100
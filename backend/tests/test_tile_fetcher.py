@@ -0,0 +1,165 @@
+import asyncio
+import time
+from io import BytesIO
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from PIL import Image
+
+from tile_cache import TileCache
+from tile_fetcher import TileFetcher
+
+def make_jpeg():
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8), (0, 128, 0)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+JPEG = make_jpeg()
+
+def jpeg_response():
+    return web.Response(body=JPEG, content_type='image/jpeg')
+
+def run_with_stand_in(handler, test, **kwargs):
+    # Serves handler as the Static Maps API on a local port for one test
+    async def main():
+        app = web.Application()
+        app.router.add_get('/staticmap', handler)
+        async with TestServer(app) as server:
+            fetcher = TileFetcher(None, base_url=str(server.make_url('/staticmap')), **{'backoff': 0.01, **kwargs})
+            try:
+                return await test(fetcher)
+            finally:
+                await fetcher.close()
+
+    return asyncio.run(main())
+
+def test_retries_rate_limited_tiles():
+    calls = []
+
+    async def handler(request):
+        calls.append(request.query['center'])
+        return jpeg_response() if len(calls) > 2 else web.Response(status=429)
+
+    assert run_with_stand_in(handler, lambda fetcher: fetcher.fetch(1.0, 2.0)) == JPEG
+    assert calls == ['1.0,2.0'] * 3
+
+def test_gives_up_after_max_retries():
+    calls = []
+
+    async def handler(request):
+        calls.append(1)
+        return web.Response(status=503)
+
+    assert run_with_stand_in(handler, lambda fetcher: fetcher.fetch(1.0, 2.0), max_retries=2) is None
+    assert len(calls) == 3
+
+def test_does_not_retry_client_errors():
+    calls = []
+
+    async def handler(request):
+        calls.append(1)
+        return web.Response(status=403)
+
+    assert run_with_stand_in(handler, lambda fetcher: fetcher.fetch(1.0, 2.0)) is None
+    assert len(calls) == 1
+
+def test_honours_retry_after():
+    calls = []
+
+    async def handler(request):
+        calls.append(time.monotonic())
+        return jpeg_response() if len(calls) > 1 else web.Response(status=429, headers={'Retry-After': '1'})
+
+    assert run_with_stand_in(handler, lambda fetcher: fetcher.fetch(1.0, 2.0)) == JPEG
+    assert calls[1] - calls[0] >= 1.0
+
+def test_limits_requests_in_flight():
+    active = [0, 0]  # current, peak
+
+    async def handler(request):
+        active[0] += 1
+        active[1] = max(active)
+        await asyncio.sleep(0.05)
+        active[0] -= 1
+        return jpeg_response()
+
+    async def fetch_many(fetcher):
+        return await asyncio.gather(*(fetcher.fetch(float(i), 0.0) for i in range(20)))
+
+    tiles = run_with_stand_in(handler, fetch_many, max_in_flight=4)
+    assert tiles == [JPEG] * 20
+    assert active[1] == 4
+
+def test_requests_the_configured_tile():
+    params = []
+
+    async def handler(request):
+        params.append(dict(request.query))
+        return jpeg_response()
+
+    run_with_stand_in(handler, lambda fetcher: fetcher.fetch(1.0, 2.0), zoom=18, size=320, image_format='jpg')
+    assert params == [{"center": "1.0,2.0", "zoom": "18", "size": "320x320", "format": "jpg", "maptype": "satellite"}]
+
+def test_non_image_bodies_are_not_cached(tmp_path):
+    cache = TileCache(str(tmp_path))
+
+    async def handler(request):
+        return web.Response(text='<html>over quota</html>', content_type='text/html')
+
+    assert run_with_stand_in(handler, lambda fetcher: fetcher.fetch(1.0, 2.0), cache=cache) is None
+    assert cache.total_bytes == 0
+
+def test_cached_non_image_is_fetched_again(tmp_path):
+    cache = TileCache(str(tmp_path))
+
+    async def test(fetcher):
+        key = cache.get_key(fetcher.get_params(1.0, 2.0))
+        cache.put(key, b'<html>written by an older version</html>')
+        return await fetcher.fetch(1.0, 2.0), cache.get(key)
+
+    async def handler(request):
+        return jpeg_response()
+
+    assert run_with_stand_in(handler, test, cache=cache) == (JPEG, JPEG)
+
+def test_concurrent_requests_for_a_tile_share_one_download():
+    calls = []
+
+    async def handler(request):
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return jpeg_response()
+
+    async def test(fetcher):
+        tiles = await asyncio.gather(*(fetcher.fetch(1.0, 2.0) for _ in range(5)), fetcher.fetch(3.0, 4.0))
+        return tiles, fetcher.stats()
+
+    tiles, stats = run_with_stand_in(handler, test)
+    assert tiles == [JPEG] * 6
+    assert len(calls) == 2
+    assert stats == {"in_flight": 0, "coalesced": 4}
+
+def test_a_cancelled_waiter_leaves_the_shared_download_running():
+    async def handler(request):
+        await asyncio.sleep(0.1)
+        return jpeg_response()
+
+    async def test(fetcher):
+        first = asyncio.ensure_future(fetcher.fetch(1.0, 2.0))
+        second = asyncio.ensure_future(fetcher.fetch(1.0, 2.0))
+        await asyncio.sleep(0.02)
+        first.cancel()
+        return await second
+
+    assert run_with_stand_in(handler, test) == JPEG
+
+def test_finished_downloads_are_not_shared_again():
+    calls = []
+
+    async def handler(request):
+        calls.append(1)
+        return web.Response(status=404) if len(calls) == 1 else jpeg_response()
+
+    async def test(fetcher):
+        return await fetcher.fetch(1.0, 2.0), await fetcher.fetch(1.0, 2.0)
+
+    assert run_with_stand_in(handler, test) == (None, JPEG)
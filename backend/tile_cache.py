@@ -0,0 +1,115 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+class TileCache:
+    def __init__(self, directory, max_bytes=2 * 1024 ** 3, memory_items=256):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.memory = OrderedDict()
+        self.entries = OrderedDict()  # key -> size on disk, least recently used first
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        os.makedirs(directory, exist_ok=True)
+        self.load_index()
+
+    @staticmethod
+    def get_key(params):
+        # The API key changes nothing about the tile, so it stays out of the address
+        parts = [f"{name}={value}" for name, value in sorted(params.items()) if name != "key"]
+        return hashlib.sha256("&".join(parts).encode()).hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def load_index(self):
+        files = []
+        for root, dirs, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                if name.endswith(".tmp"):
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name, stat.st_size))
+
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+        self.evict()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return self.memory[key]
+            on_disk = key in self.entries
+            if on_disk:
+                self.entries.move_to_end(key)
+
+        if on_disk:
+            path = self.get_path(key)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)  # mtime carries the LRU order across restarts
+            except FileNotFoundError:
+                data = None
+
+            if data is not None:
+                with self.lock:
+                    self.counters["disk_hits"] += 1
+                    self.remember(key, data)
+                return data
+
+        with self.lock:
+            self.counters["misses"] += 1
+        return None
+
+    def put(self, key, data):
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            self.total_bytes += len(data) - self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            self.remember(key, data)
+            self.evict()
+
+    def remember(self, key, data):
+        self.memory[key] = data
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.memory.pop(key, None)
+            self.counters["evictions"] += 1
+            try:
+                os.remove(self.get_path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = lookups - self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,123 @@
+import asyncio
+import random
+import aiohttp
+
+STATIC_MAPS_URL = 'https://maps.googleapis.com/maps/api/staticmap'
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Leading bytes of the formats the Static Maps API serves
+IMAGE_SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a')
+
+def is_image(data):
+    return data is not None and data.startswith(IMAGE_SIGNATURES)
+
+class TileFetcher:
+    def __init__(self, api_key, base_url=STATIC_MAPS_URL, pool_size=64, max_in_flight=32,
+                 max_retries=4, backoff=0.5, timeout=15, cache=None, zoom=18, size=320, image_format='jpg'):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.cache = cache
+        self.zoom = zoom
+        self.size = size
+        self.image_format = image_format
+        self.session = None
+        self.semaphore = None
+        self.in_flight = {}
+        self.coalesced = 0
+
+    def get_params(self, lat, lon, zoom=None, size=None):
+        size = size or self.size
+        params = {
+            "center": f"{lat},{lon}",
+            "zoom": zoom or self.zoom,
+            "size": f"{size}x{size}",
+            "format": self.image_format,
+            "maptype": "satellite",
+        }
+        if self.api_key:
+            params["key"] = self.api_key
+        return params
+
+    def get_session(self):
+        # The session and semaphore belong to the loop that first uses them,
+        # so callers must keep every fetch on one long-lived loop
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self.semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self.session
+
+    def get_retry_delay(self, attempt, response=None):
+        if response is not None and response.headers.get('Retry-After', '').isdigit():
+            return float(response.headers['Retry-After'])
+        return self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    async def fetch(self, lat, lon, zoom=None, size=None):
+        # Scans asking for a tile that is already being loaded share that load
+        params = self.get_params(lat, lon, zoom, size)
+        key = tuple(sorted(params.items()))
+        task = self.in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self.load(lat, lon, params))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def load(self, lat, lon, params):
+        if self.cache is None:
+            return await self.download(lat, lon, params)
+
+        key = self.cache.get_key(params)
+        img_data = await asyncio.to_thread(self.cache.get, key)
+        if img_data is not None and not is_image(img_data):
+            # Written before bodies were checked; fetch it again and overwrite it
+            print(f"Tile {lat},{lon} in the cache is not an image, fetching it again")
+            img_data = None
+        if img_data is None:
+            img_data = await self.download(lat, lon, params)
+            if img_data is not None:
+                await asyncio.to_thread(self.cache.put, key, img_data)
+        return img_data
+
+    async def download(self, lat, lon, params):
+        session = self.get_session()
+
+        for attempt in range(self.max_retries + 1):
+            delay = self.get_retry_delay(attempt)
+            try:
+                async with self.semaphore:
+                    async with session.get(self.base_url, params=params) as response:
+                        if response.status == 200:
+                            img_data = await response.read()
+                            # Error pages sometimes come back as 200s; they
+                            # must not end up in the cache
+                            if not response.content_type.startswith('image/') or not is_image(img_data):
+                                print(f"Tile {lat},{lon} returned {response.content_type} instead of an image")
+                                return None
+                            return img_data
+                        if response.status not in RETRY_STATUSES:
+                            print(f"Tile {lat},{lon} failed with status {response.status}")
+                            return None
+                        delay = self.get_retry_delay(attempt, response)
+                        print(f"Tile {lat},{lon} got status {response.status}, retrying in {delay:.1f}s")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Tile {lat},{lon} request error: {e!r}, retrying in {delay:.1f}s")
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(delay)
+
+        print(f"Giving up on tile {lat},{lon} after {self.max_retries + 1} attempts")
+        return None
+
+    def stats(self):
+        return {"in_flight": len(self.in_flight), "coalesced": self.coalesced}
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
@@ -42,6 +42,10 @@ const App: React.FC = () => {
       setLoadingMessage(data.message);
     });
 
+    socket.on('progress', (data: { percent: number }) => {
+      setLoadingMessage(`Scanning region (${data.percent}%)`);
+    });
+
     socket.on('complete', (data: { courtCount: number }) => {
       setLoading(false);
       setCourtCount(data.courtCount);
@@ -54,6 +58,7 @@ const App: React.FC = () => {
 
     return () => {
       socket.off('status');
+      socket.off('progress');
       socket.off('complete');
       socket.off('error');
     };
@@ -150,7 +155,7 @@ const App: React.FC = () => {
       setCourtCount(null);
       setError(null);  // Clear previous errors
       if (mapRef.current) {
-        await mapRef.current.findCourts();
+        await mapRef.current.findCourts(socket);
         setLoading(false);
         setLoadingMessage('');
       }
@@ -1,6 +1,7 @@
 import React, { useState, useRef, useCallback, forwardRef, useImperativeHandle } from 'react';
 import { GoogleMap, InfoWindow, Marker } from '@react-google-maps/api';
 import axios from 'axios';
+import type { Socket } from 'socket.io-client';
 
 const containerStyle = {
   width: '100%',
@@ -136,7 +137,7 @@ const Map = forwardRef((props: MapProps, ref) => {
     }
   };
 
-  const findCourts = async () => {
+  const findCourts = async (socket?: Socket) => {
     clearCircles();
 
     if (!rectangleRef.current) return;
@@ -146,6 +147,22 @@ const Map = forwardRef((props: MapProps, ref) => {
     const ne = bounds.getNorthEast();
     const sw = bounds.getSouthWest();
 
+    // Raw detections stream in while the scan runs; the merged list replaces them at the end
+    const previewCircles: google.maps.Circle[] = [];
+    const handleCourt = (court: { latitude: number; longitude: number }) => {
+      previewCircles.push(new window.google.maps.Circle({
+        center: { lat: court.latitude, lng: court.longitude },
+        radius: 75,
+        fillColor: '#FF6B6B',
+        fillOpacity: 0.15,
+        strokeColor: '#FF6B6B',
+        strokeOpacity: 0.5,
+        strokeWeight: 1,
+        map: mapRef.current,
+      }));
+    };
+    socket?.on('court', handleCourt);
+
     try {
       const response = await axios.get('https://api.court-find.com/find-courts', {
         params: {
@@ -153,6 +170,7 @@ const Map = forwardRef((props: MapProps, ref) => {
           lon_top_left: sw.lng(),
           lat_bottom_right: sw.lat(),
           lon_bottom_right: ne.lng(),
+          sid: socket?.id,
         },
       });
 
@@ -212,6 +230,9 @@ const Map = forwardRef((props: MapProps, ref) => {
     } catch (error) {
       console.error('Error finding courts:', error);
       setCourtCount(0);
+    } finally {
+      socket?.off('court', handleCourt);
+      previewCircles.forEach(circle => circle.setMap(null));
     }
   };
 